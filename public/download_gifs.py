@@ -1,14 +1,31 @@
 #!/usr/bin/env python3
+import hashlib
+import json
 import os
+import shutil
 import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 
 # ---------------- CONFIG ----------------
 LOOKBACK_DAYS = 7  # how many days back to search
 TIMEOUT = 20       # seconds for HTTP requests
 DEBUG = os.getenv("DL_DEBUG", "0") == "1"
+MAX_WORKERS = int(os.getenv("DL_WORKERS", "8"))    # concurrent downloads (1 = serial)
+PER_HOST_LIMIT = int(os.getenv("DL_PER_HOST", "4"))  # open connections per server
+CHUNK_SIZE = 1024 * 1024  # bytes written per read while streaming
+DOWNLOAD_RETRIES = 3      # attempts per file; later attempts resume the partial file
+NEGATIVE_TTL = int(os.getenv("DL_NEGATIVE_TTL", "900"))  # seconds a failed probe is trusted
+ARCHIVE = os.getenv("DL_ARCHIVE", "0") == "1"             # keep a dated history of every cycle
+ARCHIVE_DAYS = int(os.getenv("DL_ARCHIVE_DAYS", "90"))     # retention of archived cycles
 
 # Regions and base URLs on your file server
 BASE_URLS = {
@@ -42,6 +59,10 @@ LOCAL_DIRS = {
     "sa-southeast": os.path.join(BASE_DIR, "sa-southeast/latest_forecasts"),
 }
 LOG_FILE = os.path.join(BASE_DIR, "download_log.txt")
+MANIFEST_FILE = os.path.join(BASE_DIR, "download_manifest.json")
+CYCLE_INDEX_FILE = os.path.join(BASE_DIR, "cycle_index.json")
+ARCHIVE_DIR = os.getenv("DL_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+ARCHIVE_INDEX_FILE = os.path.join(ARCHIVE_DIR, "index.json")
 
 
 # --------------- UTILS ------------------
@@ -53,6 +74,33 @@ def dprint(msg: str):
     if DEBUG:
         log(f"DEBUG: {msg}")
 
+_session = None
+_host_slots = {}
+_pool_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    Return the shared keep-alive session. The connection pool is sized so every
+    worker can hold a connection without the pool discarding sockets.
+    """
+    global _session
+    with _pool_lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_connections=len(BASE_URLS),
+                                  pool_maxsize=max(MAX_WORKERS, PER_HOST_LIMIT))
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+def host_slot(url: str) -> threading.BoundedSemaphore:
+    """Semaphore limiting concurrent requests to the host serving `url`."""
+    host = urlsplit(url).netloc
+    with _pool_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+        return _host_slots[host]
+
 def get_date_path(days_back=0):
     """Return 'YYYYMMDD_00' (no YYYYMM directory)."""
     date = datetime.utcnow() - timedelta(days=days_back)
@@ -66,48 +114,254 @@ def check_file_exists(url: str, timeout=TIMEOUT) -> bool:
     """
     try:
         headers = {"Range": "bytes=0-0"}
-        r = requests.get(
+        with host_slot(url), get_session().get(
             url, headers=headers, timeout=timeout, allow_redirects=True, stream=True
-        )
-        dprint(f"check_file_exists: {url} -> {r.status_code}")
-        return r.status_code in (200, 206)
+        ) as r:
+            dprint(f"check_file_exists: {url} -> {r.status_code}")
+            return r.status_code in (200, 206)
     except requests.RequestException as e:
         dprint(f"check_file_exists ERROR: {url} -> {e}")
         return False
 
-def get_latest_available_url(base_url: str, model: str):
-    """
-    Find the latest directory URL that actually contains any of the GIF_FILES
-    for the specified model. Returns (dir_url, date_path) or (None, None).
-    """
-    for days_back in range(LOOKBACK_DAYS):
-        date_path = get_date_path(days_back)
-        # Test existence by checking one of the files under that path
-        for fname in GIF_FILES:
-            test_url = f"{base_url}/{date_path}/{model}/{fname}"
-            dprint(f"Probing: {test_url}")
-            if check_file_exists(test_url):
-                # Return the directory URL so we can fetch all files from it
-                dir_url = f"{base_url}/{date_path}/{model}"
-                return dir_url, date_path
-    return None, None
+# ------------- DISCOVERY ----------------
+# cycle_index.json holds the last cycle found for each "region/model" and a
+# short-lived cache of probe URLs that returned nothing, so repeated cron runs
+# while a cycle is late do not hammer the server with the same misses.
+_probe_lock = threading.Lock()
+
+def load_cycle_index() -> dict:
+    try:
+        with open(CYCLE_INDEX_FILE) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault("cycles", {})
+    now = time.time()
+    index["negative"] = {url: ts for url, ts in index.get("negative", {}).items()
+                         if now - ts < NEGATIVE_TTL}
+    return index
+
+def save_cycle_index(index: dict):
+    tmp_path = CYCLE_INDEX_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, CYCLE_INDEX_FILE)
+
+def probe(url: str, index: dict) -> bool:
+    """check_file_exists() that skips URLs which recently failed."""
+    with _probe_lock:
+        if url in index["negative"]:
+            dprint(f"Cached miss: {url}")
+            return False
+    found = check_file_exists(url)
+    if not found:
+        with _probe_lock:
+            index["negative"][url] = time.time()
+    return found
 
-def download_file(url: str, local_path: str) -> bool:
+def _dir_missing(url: str, index: dict) -> bool:
     """
-    Download a file via GET. Returns True on success.
+    True only if the server reports the directory as absent (404). Servers
+    without directory listings answer 403 for directories that do exist, so
+    anything but a 404 means "look inside".
     """
+    with _probe_lock:
+        if url in index["negative"]:
+            return True
     try:
-        r = requests.get(url, timeout=TIMEOUT, allow_redirects=True)
-        if r.status_code == 200 and r.content:
-            with open(local_path, "wb") as f:
-                f.write(r.content)
+        with host_slot(url), get_session().get(
+            url, headers={"Range": "bytes=0-0"}, timeout=TIMEOUT, stream=True
+        ) as r:
+            dprint(f"_dir_missing: {url} -> {r.status_code}")
+            missing = r.status_code == 404
+    except requests.RequestException as e:
+        dprint(f"_dir_missing ERROR: {url} -> {e}")
+        return False
+    if missing:
+        with _probe_lock:
+            index["negative"][url] = time.time()
+    return missing
+
+def _model_has_cycle(base_url: str, date_path: str, model: str, index: dict) -> bool:
+    for fname in GIF_FILES:
+        if probe(f"{base_url}/{date_path}/{model}/{fname}", index):
             return True
+    return False
+
+def discover_cycles(workers: int = MAX_WORKERS) -> dict:
+    """
+    Find the latest available cycle of every region/model in one pass.
+
+    Only dates newer than (or equal to) the last cycle stored in
+    cycle_index.json are considered. Each region's date directories are
+    probed once and shared by all models, so a missing date costs one request
+    instead of one per model and file. That shortcut is only used for a
+    region whose last known cycle directory answered with something other
+    than 404, i.e. a server that reports directories at all. Per-model probes
+    then run in waves, newest date first, each wave in parallel across
+    models; a model drops out as soon as its newest cycle is found.
+
+    Returns {(region, model): date_path or None}.
+    """
+    index = load_cycle_index()
+    window = [get_date_path(days_back) for days_back in range(LOOKBACK_DAYS)]
+
+    candidates = {}
+    known = {}  # newest cycle directory known to exist, per region
+    for region in BASE_URLS:
+        for model in MODELS:
+            last = index["cycles"].get(f"{region}/{model}")
+            dates = [d for d in window if last is None or d >= last]
+            candidates[(region, model)] = dates or window
+            if last and last > known.get(region, ""):
+                known[region] = last
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # Date directories shared by all models of a region
+        dir_jobs = {}
+        for (region, model), dates in candidates.items():
+            if region not in known:
+                continue
+            for date_path in set(dates) | {known[region]}:
+                if (region, date_path) not in dir_jobs:
+                    url = f"{BASE_URLS[region]}/{date_path}/"
+                    dir_jobs[(region, date_path)] = pool.submit(_dir_missing, url, index)
+        missing = {key for key, future in dir_jobs.items()
+                   if future.result() and not dir_jobs[(key[0], known[key[0]])].result()}
+
+        # Per-model probes, one date per wave, newest first
+        pending = {key: [d for d in dates if (key[0], d) not in missing]
+                   for key, dates in candidates.items()}
+        cycles = {key: None for key in candidates}
+        while True:
+            pending = {key: dates for key, dates in pending.items() if dates}
+            if not pending:
+                break
+            wave = {key: dates.pop(0) for key, dates in pending.items()}
+            futures = {
+                (region, model): pool.submit(_model_has_cycle, BASE_URLS[region], date_path, model, index)
+                for (region, model), date_path in wave.items()
+            }
+            for key, future in futures.items():
+                if future.result():
+                    cycles[key] = wave[key]
+                    del pending[key]
+
+    for (region, model), date_path in cycles.items():
+        if date_path:
+            index["cycles"][f"{region}/{model}"] = date_path
+    save_cycle_index(index)
+    return cycles
+
+def _partial_offset(tmp_path: str):
+    """
+    Return (offset, If-Range date) for resuming `tmp_path`, or (0, None).
+    The partial file's mtime is pinned to the server's Last-Modified, so the
+    server only honours the Range if the source has not changed since.
+    """
+    if not os.path.exists(tmp_path):
+        return 0, None
+    return os.path.getsize(tmp_path), formatdate(os.path.getmtime(tmp_path), usegmt=True)
+
+def _stream_to_partial(url: str, tmp_path: str, validators=None):
+    """
+    One GET of `url` into `tmp_path`, appending with a Range request when a
+    partial file exists, otherwise sending the conditional `validators`
+    headers. Returns the response metadata once the partial file is complete
+    (or the server answered 304 Not Modified), else None.
+    """
+    offset, if_range = _partial_offset(tmp_path)
+    if offset:
+        headers = {"Range": f"bytes={offset}-", "If-Range": if_range}
+    else:
+        headers = dict(validators or {})
+
+    with host_slot(url), get_session().get(
+        url, headers=headers, timeout=TIMEOUT, allow_redirects=True, stream=True
+    ) as r:
+        meta = {
+            "status": r.status_code,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        }
+        if r.status_code == 304 and not offset:
+            return meta
+        if r.status_code == 206 and offset:
+            # Content-Range: bytes <start>-<end>/<total>
+            byte_range, _, total = r.headers.get("Content-Range", "").partition("/")
+            if not byte_range.startswith(f"bytes {offset}-"):
+                dprint(f"download_file WARN: {url} -> unexpected Content-Range {byte_range}")
+                os.remove(tmp_path)
+                return None
+            expected = int(total) if total.isdigit() else None
+            mode = "ab"
+        elif r.status_code == 200:
+            # Fresh download (or the server ignored / refused our Range)
+            offset = 0
+            length = r.headers.get("Content-Length")
+            expected = int(length) if length and length.isdigit() else None
+            mode = "wb"
         else:
             dprint(f"download_file WARN: {url} -> {r.status_code}")
-            return False
-    except requests.RequestException as e:
-        dprint(f"download_file ERROR: {url} -> {e}")
-        return False
+            if r.status_code == 416 and offset:
+                os.remove(tmp_path)
+            return None
+
+        last_modified = r.headers.get("Last-Modified")
+        written = offset
+        complete = False
+        try:
+            with open(tmp_path, mode) as f:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+            # Without Content-Length (chunked) the end of the body is the end of the file
+            complete = expected is None or written == expected
+            if not complete:
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"short read {written}/{expected} bytes from {url}")
+        finally:
+            if last_modified:
+                ts = parsedate_to_datetime(last_modified).timestamp()
+                os.utime(tmp_path, (ts, ts))
+            elif not complete and os.path.exists(tmp_path):
+                # Without a validator a partial file cannot be resumed
+                # safely, so the next attempt downloads it again in full
+                os.remove(tmp_path)
+
+    if written == 0:
+        os.remove(tmp_path)
+        return None
+    meta["size"] = written
+    return meta
+
+def download_file(url: str, local_path: str, validators=None):
+    """
+    Stream a file via GET into '<local_path>.part' in CHUNK_SIZE pieces and
+    atomically rename it over `local_path` once complete (its size matches
+    Content-Length, when the server sends one), so the served file is never
+    left truncated. Interrupted transfers are resumed with Range requests,
+    or downloaded again in full when the server sent no Last-Modified. `validators` are conditional
+    headers (If-None-Match / If-Modified-Since) for the first request.
+
+    Returns the response metadata dict on success (status 304 means
+    `local_path` was left untouched), None on failure.
+    """
+    tmp_path = local_path + ".part"
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        resuming = os.path.exists(tmp_path)
+        try:
+            meta = _stream_to_partial(url, tmp_path, validators)
+            if meta:
+                if meta["status"] != 304:
+                    os.replace(tmp_path, local_path)
+                return meta
+            if not resuming and not os.path.exists(tmp_path):
+                # Nothing to resume: a non-retryable response (e.g. 404)
+                return None
+        except (requests.RequestException, OSError) as e:
+            dprint(f"download_file ERROR (attempt {attempt}): {url} -> {e}")
+    return None
 
 def log_download_attempt(region: str, model: str, success: bool, date_str: str):
     os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
@@ -115,32 +369,267 @@ def log_download_attempt(region: str, model: str, success: bool, date_str: str):
     with open(LOG_FILE, "a") as logf:
         logf.write(f"{date_str} - {region}/{model}: {status}\n")
 
+# ------------- MANIFEST -----------------
+# One entry per "region/model/file": the cycle it was mirrored from, the
+# server validators, size and sha256 of the local copy.
+_manifest = None
+_manifest_lock = threading.Lock()
+RUN_STATS = Counter()  # fetched / unchanged / failed files and bytes moved
 
-# --------------- MAIN -------------------
-def main():
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    for region, base_url in BASE_URLS.items():
-        for model in MODELS:
-            dir_url, date_path = get_latest_available_url(base_url, model)
-            if not dir_url:
+def load_manifest() -> dict:
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            try:
+                with open(MANIFEST_FILE) as f:
+                    _manifest = json.load(f)
+            except (OSError, ValueError):
+                _manifest = {}
+        return _manifest
+
+def save_manifest():
+    """Write the manifest atomically so a crash never leaves it half-written."""
+    with _manifest_lock:
+        if _manifest is None:
+            return
+        tmp_path = MANIFEST_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, MANIFEST_FILE)
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def sync_file(region: str, model: str, fname: str, dir_url: str, date_path: str) -> bool:
+    """
+    Bring one forecast file up to date. Files already mirrored from
+    `date_path` are skipped without a request; otherwise a conditional GET is
+    sent with the stored ETag / Last-Modified. Returns True if the local copy
+    is current.
+    """
+    key = f"{region}/{model}/{fname}"
+    src = f"{dir_url}/{fname}"
+    dst = os.path.join(LOCAL_DIRS[region], model, fname)
+    entry = load_manifest().get(key, {})
+    have_local = os.path.exists(dst) and os.path.getsize(dst) == entry.get("size")
+
+    if have_local and entry.get("cycle") == date_path:
+        dprint(f"Unchanged cycle {date_path}: {key}")
+        with _manifest_lock:
+            RUN_STATS["unchanged"] += 1
+        if ARCHIVE:
+            archive_file(region, model, fname, date_path, dst, entry.get("sha256") or sha256_file(dst))
+        return True
+
+    validators = {}
+    if have_local:
+        if entry.get("etag"):
+            validators["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            validators["If-Modified-Since"] = entry["last_modified"]
+
+    meta = download_file(src, dst, validators)
+    if not meta:
+        log(f"Missing/failed: {key} ({src})")
+        with _manifest_lock:
+            RUN_STATS["failed"] += 1
+        return False
+
+    if meta["status"] == 304:
+        log(f"Not modified: {key} ({date_path})")
+        new_entry = dict(entry, cycle=date_path)
+        stat = "unchanged"
+    else:
+        log(f"Downloaded {key} from {date_path} -> {dst}")
+        new_entry = {
+            "cycle": date_path,
+            "etag": meta["etag"],
+            "last_modified": meta["last_modified"],
+            "size": os.path.getsize(dst),
+            "sha256": sha256_file(dst),
+        }
+        stat = "fetched"
+
+    with _manifest_lock:
+        _manifest[key] = new_entry
+        RUN_STATS[stat] += 1
+        if stat == "fetched":
+            RUN_STATS["bytes"] += new_entry["size"]
+    if ARCHIVE:
+        archive_file(region, model, fname, date_path, dst, new_entry.get("sha256") or sha256_file(dst))
+    return True
+
+# -------------- ARCHIVE -----------------
+# archive/objects/<ab>/<sha256> holds every distinct file once. The dated
+# archive/<region>/<cycle>/<model>/<file> entries are hard links to those
+# objects, so identical animations across reruns and models cost no extra
+# disk. archive/index.json lists the cycles present for each region.
+
+def _link(src: str, dst: str):
+    """Hard-link `src` to `dst` (replacing dst), copying across filesystems."""
+    tmp_path = f"{dst}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+def archive_file(region: str, model: str, fname: str, cycle: str, path: str, digest: str):
+    """Store `path` under its sha256 and link it into the dated cycle folder."""
+    obj = os.path.join(ARCHIVE_DIR, "objects", digest[:2], digest)
+    if not os.path.exists(obj):
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        # latest_forecasts files are only ever replaced, never rewritten in
+        # place, so linking the served file shares its inode safely.
+        _link(path, obj)
+
+    dated = os.path.join(ARCHIVE_DIR, region, cycle, model, fname)
+    if os.path.exists(dated) and os.path.samefile(dated, obj):
+        return
+    os.makedirs(os.path.dirname(dated), exist_ok=True)
+    _link(obj, dated)
+    dprint(f"Archived {region}/{cycle}/{model}/{fname} -> {digest[:12]}")
+
+def rebuild_archive_index() -> dict:
+    """Scan the archive tree and write {region: [cycles, oldest first]}."""
+    index = {}
+    for region in BASE_URLS:
+        region_dir = os.path.join(ARCHIVE_DIR, region)
+        if os.path.isdir(region_dir):
+            index[region] = sorted(os.listdir(region_dir))
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp_path = ARCHIVE_INDEX_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, ARCHIVE_INDEX_FILE)
+    return index
+
+def archive_cycles(region: str) -> list:
+    """Archived cycles ('YYYYMMDD_00') for `region`, read from the index."""
+    try:
+        with open(ARCHIVE_INDEX_FILE) as f:
+            return json.load(f).get(region, [])
+    except (OSError, ValueError):
+        return rebuild_archive_index().get(region, [])
+
+def gc_archive(max_age_days: int = ARCHIVE_DAYS):
+    """
+    Drop cycle folders older than `max_age_days`, then delete objects no
+    longer linked from any cycle (link count 1) or from latest_forecasts.
+    """
+    cutoff = get_date_path(max_age_days)
+    removed_cycles = removed_objects = freed = 0
+    for region in BASE_URLS:
+        region_dir = os.path.join(ARCHIVE_DIR, region)
+        if not os.path.isdir(region_dir):
+            continue
+        for cycle in os.listdir(region_dir):
+            if cycle < cutoff:
+                shutil.rmtree(os.path.join(region_dir, cycle))
+                removed_cycles += 1
+
+    objects_dir = os.path.join(ARCHIVE_DIR, "objects")
+    if os.path.isdir(objects_dir):
+        for root, _, files in os.walk(objects_dir):
+            for name in files:
+                obj = os.path.join(root, name)
+                st = os.stat(obj)
+                if st.st_nlink == 1:
+                    os.remove(obj)
+                    removed_objects += 1
+                    freed += st.st_size
+
+    rebuild_archive_index()
+    log(f"Archive GC: removed {removed_cycles} cycles, {removed_objects} objects "
+        f"({freed / 1e6:.1f} MB) older than {cutoff}")
+
+def fetch_model_files(region: str, model: str, dir_url: str, date_path: str) -> bool:
+    """
+    Sync every GIF_FILES entry of one region/model. Returns True if any file
+    is current.
+    """
+    os.makedirs(os.path.join(LOCAL_DIRS[region], model), exist_ok=True)
+
+    success_any = False
+    for fname in GIF_FILES:
+        if sync_file(region, model, fname, dir_url, date_path):
+            success_any = True
+    return success_any
+
+def fetch_all(workers: int = MAX_WORKERS) -> dict:
+    """
+    Discover and sync every region/model over a bounded thread pool.
+    Discovery finishes first so download jobs never wait on another job in
+    the same pool. Returns {(region, model): success}.
+    """
+    cycles = discover_cycles(workers)
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        jobs = []
+        for (region, model), date_path in cycles.items():
+            if not date_path:
                 log(f"No recent valid forecast found for {region}/{model}. Skipping.")
-                log_download_attempt(region, model, False, today)
+                results[(region, model)] = False
                 continue
+            dir_url = f"{BASE_URLS[region]}/{date_path}/{model}"
+            os.makedirs(os.path.join(LOCAL_DIRS[region], model), exist_ok=True)
+            for fname in GIF_FILES:
+                future = pool.submit(sync_file, region, model, fname, dir_url, date_path)
+                jobs.append((region, model, future))
 
-            save_dir = os.path.join(LOCAL_DIRS[region], model)
-            os.makedirs(save_dir, exist_ok=True)
+        for region, model, future in jobs:
+            if future.result():
+                results[(region, model)] = True
+            else:
+                results.setdefault((region, model), False)
 
-            success_any = False
-            for fname in GIF_FILES:
-                src = f"{dir_url}/{fname}"
-                dst = os.path.join(save_dir, fname)
-                if download_file(src, dst):
-                    log(f"Downloaded {region}/{model}/{fname} from {date_path} -> {dst}")
-                    success_any = True
-                else:
-                    log(f"Missing/failed: {region}/{model}/{fname} ({src})")
-
-            log_download_attempt(region, model, success_any, today)
+    return results
+
+
+# --------------- MAIN -------------------
+def log_run_summary(date_str: str):
+    summary = (f"fetched {RUN_STATS['fetched']}, unchanged {RUN_STATS['unchanged']}, "
+               f"failed {RUN_STATS['failed']} files ({RUN_STATS['bytes'] / 1e6:.1f} MB)")
+    log(f"Run summary: {summary}")
+    with open(LOG_FILE, "a") as logf:
+        logf.write(f"{date_str} - summary: {summary}\n")
+
+def run_downloads(today: str):
+    if MAX_WORKERS <= 1:
+        cycles = discover_cycles(workers=1)
+        for region, base_url in BASE_URLS.items():
+            for model in MODELS:
+                date_path = cycles[(region, model)]
+                if not date_path:
+                    log(f"No recent valid forecast found for {region}/{model}. Skipping.")
+                    log_download_attempt(region, model, False, today)
+                    continue
+                dir_url = f"{base_url}/{date_path}/{model}"
+                success_any = fetch_model_files(region, model, dir_url, date_path)
+                log_download_attempt(region, model, success_any, today)
+        return
+
+    results = fetch_all(MAX_WORKERS)
+    # Log in the same region/model order as the serial run
+    for region in BASE_URLS:
+        for model in MODELS:
+            log_download_attempt(region, model, results[(region, model)], today)
+
+def main():
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    load_manifest()
+    try:
+        run_downloads(today)
+    finally:
+        save_manifest()
+    log_run_summary(today)
+    if ARCHIVE:
+        gc_archive()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""
+Animate the last days of SST, SST anomaly, marine heatwave intensity and SLA.
+
+    python build_animations.py                      # last 30 days of every product, mp4
+    python build_animations.py --days 14 --products sst,sla --format gif
+
+Frames are read one day at a time from the long records and streamed to
+ffmpeg (see animate.py). Colour ranges are the fixed ones of the map tiles
+(tiles.PRODUCTS), so every frame and every run share one scale.
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from animate import animate, daily_frames  # noqa: E402
+from catalog import Catalog  # noqa: E402
+from climatology import hobday_doy, load_or_build_seasonal_mean, load_or_build_threshold  # noqa: E402
+from cmems import SSH_DATASET, SST_DATASET  # noqa: E402
+from tiles import PRODUCTS  # noqa: E402
+
+# As for the heatwave products (generate_heatwaves.py), so the cached
+# climatologies are shared
+MHW_PERCENTILE = 0.9
+WINDOW_DAYS = 5
+SMOOTH_DAYS = 31
+
+# animation: (tile product for the colour range, title, colorbar label)
+ANIMATIONS = {
+    "sst": ("sst", "Sea Surface Temperature - {date}", "SST (°C)"),
+    "sst_anomaly": ("sst_anomaly", "SST Anomaly vs Day-of-Year Climatology - {date}", "SST Anomaly (°C)"),
+    "mhw": ("mhw_intensity", "Marine Heatwave Intensity (SST > 90th Percentile) - {date}", "Marine Heatwave (°C)"),
+    "sla": ("sla", "SSH Anomaly (SLA) - {date}", "SSH Anomaly (m)"),
+}
+
+# --- Detect environment ---
+HOSTNAME = socket.gethostname()
+
+if HOSTNAME == "COMP000000183":
+    print("📌 Running on Local Machine")
+    BASE_DIR = "/home/nc.memela/Projects/tmp"
+elif HOSTNAME == "ocimsvaps.ocean.gov.za":
+    print("📌 Running on Server")
+    BASE_DIR = "/home/nkululeko/tmp"
+else:
+    raise EnvironmentError("🚨 Unknown environment. Please configure the correct BASE_DIR.")
+
+SST_LONG_RECORD = os.path.join(BASE_DIR, "sat-sst", "long-record")
+SSH_LONG_RECORD = os.path.join(BASE_DIR, "sat-ssh", "long-record")
+
+
+def doy_lookup(climatology):
+    """transform() for daily_frames() subtracting the day-of-year `climatology`."""
+    def subtract(date, field):
+        return field - climatology.sel(doy=int(hobday_doy([date])[0])).values
+    return subtract
+
+
+def sst_frames(name: str, days: int):
+    catalog = Catalog(SST_LONG_RECORD, SST_DATASET)
+    sst_long_record = (catalog.select(['analysed_sst'])['analysed_sst'] - 273.15).rename('analysed_sst')
+    sst = sst_long_record.isel(time=slice(-days, None))
+    cache_dir = os.path.join(SST_LONG_RECORD, "climatology")
+    if name == "sst":
+        return sst, daily_frames(sst)
+    if name == "sst_anomaly":
+        seasonal_mean = load_or_build_seasonal_mean(sst_long_record, cache_dir, window=WINDOW_DAYS,
+                                                    smooth=SMOOTH_DAYS)
+        return sst, daily_frames(sst, doy_lookup(seasonal_mean))
+    threshold = load_or_build_threshold(sst_long_record, cache_dir, q=MHW_PERCENTILE, window=WINDOW_DAYS,
+                                        smooth=SMOOTH_DAYS)
+    above_threshold = doy_lookup(threshold)
+
+    def intensity(date, field):
+        excess = above_threshold(date, field)
+        return np.where(excess > 0, excess, np.nan)
+    return sst, daily_frames(sst, intensity)
+
+
+def ssh_frames(days: int):
+    sla = Catalog(SSH_LONG_RECORD, SSH_DATASET).select(['sla'])['sla'].isel(time=slice(-days, None))
+    return sla, daily_frames(sla)
+
+
+parser = argparse.ArgumentParser(description="Animate the last days of the satellite products.")
+parser.add_argument("--days", type=int, default=30, help="number of days to animate (default: 30)")
+parser.add_argument("--products", default=",".join(ANIMATIONS),
+                    help=f"comma-separated products (default: {','.join(ANIMATIONS)})")
+parser.add_argument("--format", choices=["mp4", "gif"], default="mp4", help="output format (default: mp4)")
+args = parser.parse_args()
+
+products = [name.strip() for name in args.products.split(",") if name.strip()]
+unknown = [name for name in products if name not in ANIMATIONS]
+if unknown:
+    raise KeyError(f"❌ Unknown products: {', '.join(unknown)}. Known products: {', '.join(ANIMATIONS)}")
+
+for name in products:
+    tile_product, title, label = ANIMATIONS[name]
+    cmap, vmin, vmax, _ = PRODUCTS[tile_product]
+    da, frames = ssh_frames(args.days) if name == "sla" else sst_frames(name, args.days)
+    output = f"{name}_animation.{args.format}"
+
+    start = time.perf_counter()
+    count = animate(output, da['longitude'].values, da['latitude'].values, frames, cmap, vmin, vmax, title, label)
+    seconds = time.perf_counter() - start
+    print(f"🎞️ {output}: {count} days in {seconds:.1f} s ({count / seconds:.1f} frames/s)")
+
+print("✅ Animations complete!")
@@ -0,0 +1,231 @@
+"""
+Shared basemap for the Cartopy static plots.
+
+Every static map draws the same background: land, 50 m coastlines, country
+borders and labelled gridlines. Reading and clipping the Natural
+Earth shapefiles for these layers, and letting Cartopy project them and
+place the gridline labels, costs more than drawing the data itself.
+
+Basemap prepares the layers once per domain. It clips them to the map
+extent and stores the vertices, with the gridline ticks and labels, in a
+small cache file (<BASEMAP_CACHE>/basemap_<key>.pkl). A figure then adds
+them as plain matplotlib collections, and the product script only draws
+its data layer on top:
+
+    domain = basemap_for_grid(lon, lat)
+    fig, ax = domain.figure()
+    ax.pcolormesh(lon, lat, field, transform=ccrs.PlateCarree(), zorder=1)
+
+    python basemap.py    # render time per figure, Cartopy features vs cached basemap
+"""
+import functools
+import hashlib
+import io
+import json
+import os
+import pickle
+import time
+
+import cartopy
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import shapely
+from cartopy.mpl.path import shapely_to_path
+from cartopy.mpl.ticker import LatitudeFormatter, LatitudeLocator, LongitudeFormatter, LongitudeLocator
+from matplotlib.collections import LineCollection, PathCollection
+
+BASEMAP_CACHE = os.getenv("SOMISANA_BASEMAP_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "somisana"))
+BASEMAP_VERSION = 1  # bump when the prepared layers change to invalidate caches
+
+COASTLINE_SCALE = "50m"  # as ax.coastlines(resolution='50m'); land and borders
+# use the scale Cartopy picks for the extent, as cfeature.LAND and cfeature.BORDERS do
+
+LAND_COLOR = "saddlebrown"
+GRID_STYLE = dict(linewidth=0.5, color="gray", alpha=0.5)
+
+
+def _lines(geometries) -> list:
+    """Vertex arrays of every line in `geometries` (lines or polygon boundaries)."""
+    lines = []
+    for geometry in geometries:
+        for part in getattr(geometry, "geoms", [geometry]):
+            if part.is_empty:
+                continue
+            if part.geom_type == "Polygon":
+                lines.extend(np.asarray(ring.coords) for ring in [part.exterior, *part.interiors])
+            else:
+                lines.append(np.asarray(part.coords))
+    return lines
+
+
+def _clipped(feature, box) -> list:
+    return [geometry.intersection(box) for geometry in feature.geometries() if geometry.intersects(box)]
+
+
+def prepare_layers(extent: tuple) -> dict:
+    """
+    Land paths, coastline and border vertices clipped to `extent` (west,
+    east, south, north), and the gridline ticks with their labels.
+    """
+    west, east, south, north = extent
+    box = shapely.box(west, south, east, north)
+    scale = cfeature.AdaptiveScaler("110m", (("50m", 50), ("10m", 15))).scale_from_extent(extent)
+
+    land = [shapely_to_path(geometry) for geometry in _clipped(cfeature.LAND.with_scale(scale), box)
+            if not geometry.is_empty]
+    coastline = _lines(_clipped(cfeature.COASTLINE.with_scale(COASTLINE_SCALE), box))
+    borders = _lines(_clipped(cfeature.BORDERS.with_scale(scale), box))
+
+    # Gridlines where Cartopy's gridliner puts them for a PlateCarree map
+    xticks = [x for x in LongitudeLocator().tick_values(west, east) if west <= x <= east]
+    yticks = [y for y in LatitudeLocator().tick_values(south, north) if south <= y <= north]
+    xformat, yformat = LongitudeFormatter(), LatitudeFormatter()
+    return {
+        "extent": extent,
+        "land": [(path.vertices, path.codes) for path in land],
+        "coastline": coastline,
+        "borders": borders,
+        "xticks": (xticks, [xformat(x) for x in xticks]),
+        "yticks": (yticks, [yformat(y) for y in yticks]),
+    }
+
+
+class Basemap:
+    """Prepared background layers of one map domain, cached on disk."""
+
+    def __init__(self, extent: tuple, cache_dir: str = BASEMAP_CACHE):
+        self.extent = tuple(round(float(value), 6) for value in extent)
+        key = {
+            "version": BASEMAP_VERSION,
+            "extent": self.extent,
+            "coastline": COASTLINE_SCALE,
+            "cartopy": cartopy.__version__,
+        }
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        self.path = os.path.join(cache_dir, f"basemap_{digest[:16]}.pkl")
+        self.layers = self._load_or_prepare()
+
+    def _load_or_prepare(self) -> dict:
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                return pickle.load(f)
+
+        print(f"🗺️ Preparing basemap for {self.extent}...")
+        layers = prepare_layers(self.extent)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(layers, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        return layers
+
+    def draw(self, ax, gridlines: bool = True):
+        """Add the background layers to a PlateCarree GeoAxes, in data coordinates."""
+        layers = self.layers
+        ax.set_extent(self.extent, crs=ccrs.PlateCarree())
+        ax.add_collection(PathCollection(
+            [matplotlib.path.Path(vertices, codes) for vertices, codes in layers["land"]],
+            facecolor=LAND_COLOR, edgecolor=LAND_COLOR, zorder=0, transform=ax.transData,
+        ))
+        ax.add_collection(LineCollection(layers["coastline"], colors="black", linewidths=1,
+                                         zorder=3, transform=ax.transData))
+        ax.add_collection(LineCollection(layers["borders"], colors="black", linewidths=1,
+                                         linestyles=":", zorder=3, transform=ax.transData))
+
+        if gridlines:
+            (xticks, xlabels), (yticks, ylabels) = layers["xticks"], layers["yticks"]
+            west, east, south, north = self.extent
+            grid = [[(x, south), (x, north)] for x in xticks] + [[(west, y), (east, y)] for y in yticks]
+            ax.add_collection(LineCollection(grid, zorder=4, transform=ax.transData, **GRID_STYLE))
+            ax.set_xticks(xticks)
+            ax.set_xticklabels(xlabels)
+            ax.set_yticks(yticks)
+            ax.set_yticklabels(ylabels)
+            ax.tick_params(length=0)
+
+    def figure(self, figsize=(8, 6), gridlines: bool = True):
+        """New (figure, GeoAxes) with the background drawn, ready for the data layer."""
+        fig = plt.figure(figsize=figsize)
+        ax = plt.axes(projection=ccrs.PlateCarree())
+        self.draw(ax, gridlines)
+        return fig, ax
+
+
+def grid_extent(lon, lat) -> tuple:
+    """(west, east, south, north) of the cell edges of a regular grid, as pcolormesh draws it."""
+    lon, lat = np.asarray(lon), np.asarray(lat)
+    dx = abs(lon[1] - lon[0]) / 2 if lon.size > 1 else 0.0
+    dy = abs(lat[1] - lat[0]) / 2 if lat.size > 1 else 0.0
+    return (lon.min() - dx, lon.max() + dx, lat.min() - dy, lat.max() + dy)
+
+
+@functools.lru_cache(maxsize=None)
+def _basemap(extent: tuple, cache_dir: str) -> Basemap:
+    return Basemap(extent, cache_dir)
+
+
+def basemap_for_grid(lon, lat, cache_dir: str = BASEMAP_CACHE) -> Basemap:
+    """Basemap covering the (lon, lat) grid, shared by every figure of the process."""
+    extent = tuple(round(float(value), 6) for value in grid_extent(lon, lat))
+    return _basemap(extent, cache_dir)
+
+
+def _render_cartopy(lon, lat, field, dpi):
+    # The per-figure code the product scripts used before the shared basemap
+    plt.figure(figsize=(8, 6))
+    ax = plt.axes(projection=ccrs.PlateCarree())
+    p = ax.pcolormesh(lon, lat, field, cmap="jet", transform=ccrs.PlateCarree(), zorder=1)
+    ax.coastlines(resolution="50m", color="black", linewidth=1, zorder=3)
+    ax.add_feature(cfeature.BORDERS, linestyle=":", edgecolor="black", zorder=3)
+    ax.add_feature(cfeature.LAND, color=LAND_COLOR, zorder=0)
+    gl = ax.gridlines(draw_labels=True, **GRID_STYLE)
+    gl.top_labels = False
+    gl.right_labels = False
+    plt.colorbar(p, orientation="vertical", shrink=0.8, pad=0.05)
+    plt.savefig(io.BytesIO(), dpi=dpi, bbox_inches="tight")
+    plt.close()
+
+
+def _render_basemap(domain, lon, lat, field, dpi):
+    domain.figure()
+    p = plt.pcolormesh(lon, lat, field, cmap="jet", transform=ccrs.PlateCarree(), zorder=1)
+    plt.colorbar(p, orientation="vertical", shrink=0.8, pad=0.05)
+    plt.savefig(io.BytesIO(), dpi=dpi, bbox_inches="tight")
+    plt.close()
+
+
+def benchmark(figures: int = 5, dpi: int = 300):
+    """
+    Render time of a static map, Cartopy features vs the cached basemap: the
+    first figure of the process (what a product script pays) and the mean
+    of the `figures` after it.
+    """
+    from cmems import BBOX
+
+    lon = np.arange(BBOX["minimum_longitude"], BBOX["maximum_longitude"], 0.05)
+    lat = np.arange(BBOX["minimum_latitude"], BBOX["maximum_latitude"], 0.05)
+    field = np.add.outer(np.sin(np.radians(lat) * 20), np.cos(np.radians(lon) * 20)).astype(np.float32)
+
+    def timed(render) -> tuple:
+        start = time.perf_counter()
+        render()
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(figures):
+            render()
+        return first, (time.perf_counter() - start) / figures
+
+    before = timed(lambda: _render_cartopy(lon, lat, field, dpi))
+    after = timed(lambda: _render_basemap(basemap_for_grid(lon, lat), lon, lat, field, dpi))
+    print(f"🗺️ Basemap cache: {basemap_for_grid(lon, lat).path}")
+    for label, old, new in (("first figure", before[0], after[0]), ("each further figure", before[1], after[1])):
+        print(f"⏱️ {label} at {dpi} dpi: {old:.2f} s with Cartopy features, "
+              f"{new:.2f} s with the cached basemap ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    matplotlib.use("Agg")
+    benchmark()
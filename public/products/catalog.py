@@ -0,0 +1,72 @@
+"""
+Catalog over the consolidated per-dataset Zarr stores.
+
+Every satellite dataset is kept as one time-appendable Zarr store per
+directory (<directory>/<dataset_id>.zarr): the daily downloads append each
+new day to the store in the daily directory, and the long record lives in
+the same format under long-record/. Stores are chunked (TIME_CHUNK,
+SPACE_CHUNK, SPACE_CHUNK), so a map read touches one time chunk per tile
+and a per-pixel time series one column of chunks.
+
+Generators ask the Catalog for the latest date, the date range or a
+time/bbox selection instead of relying on the order of file names.
+"""
+import glob
+import os
+
+import pandas as pd
+import xarray as xr
+
+from loader import open_product
+from long_record import append_to_store, seed_from_files, store_path
+
+
+class Catalog:
+    """Time index and selections over <directory>/<dataset_id>.zarr."""
+
+    def __init__(self, directory: str, dataset_id: str):
+        self.directory = directory
+        self.dataset_id = dataset_id
+        self.store = store_path(directory, dataset_id)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.store)
+
+    def dates(self) -> pd.DatetimeIndex:
+        """Every time step in the store; only the time coordinate is read."""
+        if not self.exists():
+            return pd.DatetimeIndex([])
+        with xr.open_zarr(self.store) as ds:
+            return pd.DatetimeIndex(ds["time"].values)
+
+    def latest_date(self):
+        """Last time step as a Timestamp, or None for an empty catalog."""
+        dates = self.dates()
+        return dates[-1] if len(dates) else None
+
+    def date_range(self):
+        """(first, last) time steps, or None for an empty catalog."""
+        dates = self.dates()
+        return (dates[0], dates[-1]) if len(dates) else None
+
+    def variables(self) -> list:
+        with xr.open_zarr(self.store) as ds:
+            return [name for name, var in ds.data_vars.items() if "time" in var.dims]
+
+    def select(self, variables: list = None, time=None, bbox: dict = None, chunks=None) -> xr.Dataset:
+        """
+        Lazy, decoded float32 selection (see loader.open_product): `time` is
+        None, a (start, end) tuple, a single date or "latest".
+        """
+        if not self.exists():
+            raise FileNotFoundError(f"❌ No store for {self.dataset_id} at {self.store}")
+        return open_product(self.store, variables or self.variables(), time=time, bbox=bbox, chunks=chunks)
+
+    def append(self, ds: xr.Dataset, storage: str = "native") -> int:
+        """Append the days of `ds` newer than the latest date; returns the number written."""
+        return append_to_store(ds, self.store, storage=storage)
+
+    def import_files(self, pattern: str, variables: list = None, storage: str = "native") -> int:
+        """Append legacy per-day netCDF files matching `pattern` (in `directory`), oldest first."""
+        files = sorted(glob.glob(os.path.join(self.directory, pattern)))
+        return seed_from_files(self.store, files, variables, storage) if files else 0
@@ -0,0 +1,103 @@
+"""
+Out-of-core, multi-core execution over the satellite long records.
+
+Reductions along time (percentiles, means) are run on spatial tiles: each
+worker loads the full time series of one tile only, so peak memory is
+bounded by the tile size times the number of workers rather than by the
+size of the record. Tile size is derived from a memory ceiling.
+
+    SOMISANA_WORKERS       worker count (default: all cores)
+    SOMISANA_MEMORY_LIMIT  memory ceiling for all workers, e.g. "8GB" (default 8GB)
+    SOMISANA_EXECUTOR      "process" (default) or "thread"
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+import xarray as xr
+
+WORKERS = int(os.getenv("SOMISANA_WORKERS", os.cpu_count() or 1))
+MEMORY_LIMIT = os.getenv("SOMISANA_MEMORY_LIMIT", "8GB")
+EXECUTOR = os.getenv("SOMISANA_EXECUTOR", "process")
+
+# Process pools fork explicitly. Workers rely on state the parent already
+# prepared (render.py, tiles.py), and the generator scripts have no
+# __main__ guard, so "spawn" or "forkserver" (the Linux default from
+# Python 3.14) would re-run a script's top level in every worker.
+FORK = multiprocessing.get_context("fork")
+
+# Working copies per loaded value (block, float32 cast, selections, sort buffers)
+WORKING_COPIES = 4
+
+_UNITS = {"KB": 1e3, "MB": 1e6, "GB": 1e9, "KIB": 2**10, "MIB": 2**20, "GIB": 2**30, "B": 1}
+
+
+def parse_bytes(text) -> int:
+    """'8GB' / '512MiB' / 1000 -> bytes."""
+    if isinstance(text, (int, float)):
+        return int(text)
+    value = text.strip().upper()
+    for unit in sorted(_UNITS, key=len, reverse=True):
+        if value.endswith(unit):
+            return int(float(value[: -len(unit)]) * _UNITS[unit])
+    return int(float(value))
+
+
+def tile_size(ntime: int, workers: int = WORKERS, memory_limit=MEMORY_LIMIT) -> int:
+    """Edge length of square tiles whose float32 time series fit the memory ceiling."""
+    budget = parse_bytes(memory_limit) / max(1, workers)
+    pixels = budget / (ntime * 4 * WORKING_COPIES)
+    return max(8, int(math.sqrt(pixels)))
+
+
+def spatial_chunks(ntime: int, workers: int = WORKERS, memory_limit=MEMORY_LIMIT) -> dict:
+    """dask chunks for opening a record lazily in space tiles with full time series."""
+    edge = tile_size(ntime, workers, memory_limit)
+    return {"time": -1, "latitude": edge, "longitude": edge}
+
+
+def compute(obj, workers: int = WORKERS):
+    """Compute a lazy xarray object on a local pool of at most `workers` threads."""
+    return obj.compute(scheduler="threads", num_workers=max(1, workers))
+
+
+def _apply_tile(func, tile: xr.DataArray) -> np.ndarray:
+    return func(tile.values.astype(np.float32, copy=False))
+
+
+def map_tiles(func, da: xr.DataArray, tile: int = None, workers: int = WORKERS,
+              memory_limit=MEMORY_LIMIT, executor: str = EXECUTOR) -> np.ndarray:
+    """
+    Apply `func` to every spatial tile of `da` (time, latitude, longitude)
+    and assemble the (..., latitude, longitude) results.
+
+    `func` receives a float32 (time, y, x) numpy block and must return an
+    array ending in (y, x); with the process executor it has to be picklable
+    (a module-level function or functools.partial of one). Tiles are handed
+    to workers as lazy selections, so each worker reads only its own tile.
+    """
+    da = da.transpose("time", "latitude", "longitude")
+    ny, nx = da.sizes["latitude"], da.sizes["longitude"]
+    edge = tile or tile_size(da.sizes["time"], workers, memory_limit)
+    tiles = [(slice(y, min(y + edge, ny)), slice(x, min(x + edge, nx)))
+             for y in range(0, ny, edge) for x in range(0, nx, edge)]
+
+    out = None
+    if executor == "process" and workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=FORK)
+    else:
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    with pool as ex:
+        futures = {ex.submit(_apply_tile, func, da.isel(latitude=ys, longitude=xs)): (ys, xs)
+                   for ys, xs in tiles}
+        for done, future in enumerate(as_completed(futures), 1):
+            ys, xs = futures[future]
+            result = future.result()
+            if out is None:
+                out = np.empty(result.shape[:-2] + (ny, nx), dtype=result.dtype)
+            out[..., ys, xs] = result
+            if done % max(1, len(tiles) // 10) == 0 or done == len(tiles):
+                print(f"🧮 {done}/{len(tiles)} tiles ({edge}x{edge}) done")
+    return out
@@ -0,0 +1,248 @@
+"""
+Cached climatologies for the satellite products.
+
+Percentile thresholds follow Hobday et al. (2016): for each day of year the
+percentile is taken over every value within a ±`window` day window across all
+baseline years, then smoothed with a `smooth`-day circular moving average.
+Results are stored as netCDF next to the long record under a fingerprint of
+the inputs (baseline period, grid, parameters), so daily runs only open the
+cached file. With the default baseline of complete years only, the cache is
+rebuilt once a year rather than every time a day is appended.
+
+The Hobday seasonal mean is built and cached the same way. The 12-month
+mean climatology of the monthly SST record, used by the SST anomaly
+product, is cached too and rebuilt when the monthly input files change.
+"""
+import functools
+import glob
+import hashlib
+import json
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from chunked import MEMORY_LIMIT, WORKERS, compute, map_tiles
+
+CLIMATOLOGY_VERSION = 2  # bump when the algorithm changes to invalidate caches
+
+
+def hobday_doy(times) -> np.ndarray:
+    """
+    Day of year on a 366-day calendar: 29 February is day 60 and, in non-leap
+    years, every day from 1 March on is shifted by one so a given calendar
+    date always maps to the same index.
+    """
+    index = pd.DatetimeIndex(times)
+    doy = index.dayofyear.values.copy()
+    doy[(~index.is_leap_year) & (index.month > 2)] += 1
+    return doy
+
+
+def default_baseline(times) -> tuple:
+    """(first day, 31 December of the last complete year) of `times`."""
+    index = pd.DatetimeIndex(times)
+    last = index[-1]
+    end_year = last.year if (last.month, last.day) == (12, 31) else last.year - 1
+    if end_year < index[0].year:
+        end_year = last.year  # less than one complete year: use everything
+    return index[0].normalize(), pd.Timestamp(end_year, 12, 31)
+
+
+def fingerprint(da: xr.DataArray, params: dict, source=None) -> str:
+    """
+    Hash identifying the inputs of a climatology: the time axis and grid of
+    `da`, the parameters and the size and mtime of the `source` file (or
+    list of files) it was read from.
+    """
+    times = pd.DatetimeIndex(da["time"].values)
+    lat = da["latitude"].values
+    lon = da["longitude"].values
+    key = {
+        "version": CLIMATOLOGY_VERSION,
+        "name": da.name,
+        "time": [str(times[0]), str(times[-1]), len(times)],
+        "grid": [float(lat[0]), float(lat[-1]), len(lat), float(lon[0]), float(lon[-1]), len(lon)],
+        "params": params,
+    }
+    sources = [source] if isinstance(source, str) else sorted(source or [])
+    files = [path for path in sources if os.path.isfile(path)]
+    if files:
+        key["source"] = [[os.path.abspath(path), os.stat(path).st_size, int(os.stat(path).st_mtime)]
+                         for path in files]
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _load_or_build(cache_dir: str, name: str, key: str, build) -> xr.DataArray:
+    """
+    Open <cache_dir>/<name>_<key[:16]>.nc, or write it from build() and
+    remove the caches of the same `name` built from older inputs.
+    """
+    path = os.path.join(cache_dir, f"{name}_{key[:16]}.nc")
+    if os.path.exists(path):
+        print(f"📂 Using cached climatology {path}")
+        return xr.open_dataarray(path)
+
+    result = build()
+    result.attrs["fingerprint"] = key
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + ".tmp"
+    result.to_netcdf(tmp_path)
+    os.replace(tmp_path, path)
+    for stale in glob.glob(os.path.join(cache_dir, f"{name}_*.nc")):
+        if stale != path:
+            os.remove(stale)
+    return xr.open_dataarray(path)
+
+
+def _circular_smooth(values: np.ndarray, width: int) -> np.ndarray:
+    """Moving average of `width` days along axis 0, wrapping around the year."""
+    if width <= 1:
+        return values
+    half = width // 2
+    padded = np.concatenate([values[-half:], values, values[:half]], axis=0)
+    csum = np.cumsum(padded, axis=0, dtype=np.float64)
+    csum = np.concatenate([np.zeros((1,) + values.shape[1:]), csum], axis=0)
+    return ((csum[width:] - csum[:-width]) / width)[: values.shape[0]].astype(values.dtype)
+
+
+def _doy_windows(doy: np.ndarray, window: int):
+    """(day of year, boolean time mask of its ±`window` day window) for every day of the year."""
+    offsets = np.arange(-window, window + 1)
+    for d in range(1, 367):
+        yield d, np.isin(doy, (d - 1 + offsets) % 366 + 1)
+
+
+def _doy_statistic(block: np.ndarray, doy: np.ndarray, window: int, smooth: int, stat, nanstat) -> np.ndarray:
+    """
+    (366, ...) `stat` over the ±`window` day window of every day of year,
+    smoothed. Pixels with missing days in a window use `nanstat`, so a
+    missing day only drops out of the samples; land pixels (all NaN) stay
+    NaN.
+    """
+    missing = np.isnan(block)
+    land = missing.all(axis=0)
+    out = np.empty((366,) + block.shape[1:], dtype=np.float32)
+    for d, in_window in _doy_windows(doy, window):
+        samples = block[in_window]
+        if not len(samples):
+            out[d - 1] = np.nan
+            continue
+        out[d - 1] = stat(samples)
+        gaps = missing[in_window].any(axis=0) & ~land
+        if gaps.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # windows with no valid day stay NaN
+                out[d - 1][gaps] = nanstat(samples[:, gaps])
+    return _circular_smooth(out, smooth)
+
+
+def doy_percentile_block(block: np.ndarray, doy: np.ndarray, q: float, window: int,
+                         smooth: int) -> np.ndarray:
+    """
+    (366, ...) Hobday percentile of a (time, ...) numpy block, skipping
+    missing days. Land pixels (all NaN) stay NaN.
+    """
+    return _doy_statistic(block, doy, window, smooth,
+                          lambda samples: np.percentile(samples, q * 100, axis=0),
+                          lambda samples: np.nanpercentile(samples, q * 100, axis=0))
+
+
+def doy_mean_block(block: np.ndarray, doy: np.ndarray, window: int, smooth: int) -> np.ndarray:
+    """(366, ...) Hobday seasonal mean of a (time, ...) numpy block, windowed and smoothed like the percentile."""
+    return _doy_statistic(block, doy, window, smooth,
+                          lambda samples: samples.mean(axis=0),
+                          lambda samples: np.nanmean(samples, axis=0))
+
+
+def _doy_dataarray(values: np.ndarray, da: xr.DataArray, name: str) -> xr.DataArray:
+    return xr.DataArray(
+        values,
+        dims=("doy", "latitude", "longitude"),
+        coords={"doy": np.arange(1, 367), "latitude": da["latitude"], "longitude": da["longitude"]},
+        name=name,
+    )
+
+
+def percentile_climatology(da: xr.DataArray, q: float = 0.9, window: int = 5, smooth: int = 31,
+                           tile: int = None, workers: int = WORKERS,
+                           memory_limit=MEMORY_LIMIT) -> xr.DataArray:
+    """
+    Day-of-year `q` percentile of `da` (time, latitude, longitude), computed
+    out of core with chunked.map_tiles(): spatial tiles sized to
+    `memory_limit` are spread over `workers`, so only a few tiles of the
+    record are in memory at a time.
+    """
+    doy = hobday_doy(da["time"].values)
+    block_func = functools.partial(doy_percentile_block, doy=doy, q=q, window=window, smooth=smooth)
+    result = map_tiles(block_func, da, tile=tile, workers=workers, memory_limit=memory_limit)
+    return _doy_dataarray(result, da, f"{da.name}_p{int(round(q * 100))}")
+
+
+def mean_climatology(da: xr.DataArray, window: int = 5, smooth: int = 31, tile: int = None,
+                     workers: int = WORKERS, memory_limit=MEMORY_LIMIT) -> xr.DataArray:
+    """Day-of-year seasonal mean of `da`, computed tile by tile like percentile_climatology()."""
+    doy = hobday_doy(da["time"].values)
+    block_func = functools.partial(doy_mean_block, doy=doy, window=window, smooth=smooth)
+    result = map_tiles(block_func, da, tile=tile, workers=workers, memory_limit=memory_limit)
+    return _doy_dataarray(result, da, f"{da.name}_mean")
+
+
+def load_or_build_threshold(da: xr.DataArray, cache_dir: str, q: float = 0.9, window: int = 5,
+                            smooth: int = 31, baseline: tuple = None, source: str = None) -> xr.DataArray:
+    """
+    Day-of-year percentile threshold of `da` over `baseline` (default: every
+    complete year), loaded from `cache_dir` when the input fingerprint matches
+    and computed and stored otherwise.
+    """
+    start, end = baseline or default_baseline(da["time"].values)
+    da = da.sel(time=slice(start, end))
+    params = {"q": q, "window": window, "smooth": smooth}
+
+    def build():
+        print(f"🧮 Building {q:.0%} day-of-year climatology {start:%Y-%m-%d} to {end:%Y-%m-%d}...")
+        threshold = percentile_climatology(da, q, window, smooth)
+        threshold.attrs.update(baseline_start=str(start.date()), baseline_end=str(end.date()), **params)
+        return threshold
+
+    return _load_or_build(cache_dir, f"{da.name}_p{int(round(q * 100))}_doy",
+                          fingerprint(da, params, source), build)
+
+
+def load_or_build_seasonal_mean(da: xr.DataArray, cache_dir: str, window: int = 5, smooth: int = 31,
+                                baseline: tuple = None, source: str = None) -> xr.DataArray:
+    """Day-of-year seasonal mean of `da` over `baseline`, cached like load_or_build_threshold()."""
+    start, end = baseline or default_baseline(da["time"].values)
+    da = da.sel(time=slice(start, end))
+    params = {"stat": "mean", "window": window, "smooth": smooth}
+
+    def build():
+        print(f"🧮 Building day-of-year seasonal mean {start:%Y-%m-%d} to {end:%Y-%m-%d}...")
+        seas = mean_climatology(da, window, smooth)
+        seas.attrs.update(baseline_start=str(start.date()), baseline_end=str(end.date()), **params)
+        return seas
+
+    return _load_or_build(cache_dir, f"{da.name}_mean_doy", fingerprint(da, params, source), build)
+
+
+def monthly_climatology(da: xr.DataArray) -> xr.DataArray:
+    """
+    (month, latitude, longitude) mean of `da` for each calendar month, in a
+    single groupby pass. Months without data are NaN.
+    """
+    clim = compute(da.groupby("time.month").mean("time", skipna=True))
+    return clim.reindex(month=np.arange(1, 13)).astype(np.float32)
+
+
+def load_or_build_monthly(da: xr.DataArray, cache_dir: str, sources: list = None) -> xr.DataArray:
+    """
+    12-month mean climatology of the monthly record `da`, cached in
+    `cache_dir` and rebuilt when `sources` (the monthly files) change.
+    """
+    def build():
+        print(f"🧮 Building the monthly climatology of {da.name} from {da.sizes['time']} months...")
+        return monthly_climatology(da).rename(f"{da.name}_monthly")
+
+    return _load_or_build(cache_dir, f"{da.name}_monthly", fingerprint(da, {"stat": "mean"}, sources), build)
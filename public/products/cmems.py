@@ -0,0 +1,211 @@
+"""
+Subset providers for the satellite products.
+
+The download scripts never call copernicusmarine directly: they go through a
+provider with `subset()` and `time_coverage()` methods, so a
+LocalFakeProvider serving a small local dataset can stand in for CMEMS when
+working offline.
+"""
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import xarray as xr
+
+from loader import select_bbox
+
+SST_DATASET = "METOFFICE-GLO-SST-L4-NRT-OBS-SST-V2"
+SSH_DATASET = "cmems_obs-sl_glo_phy-ssh_nrt_allsat-l4-duacs-0.125deg_P1D"
+
+AVAILABILITY_TTL = 3600  # seconds a dataset's time coverage is trusted
+
+# South African domain shared by every product
+BBOX = {
+    "minimum_longitude": 10,
+    "maximum_longitude": 40,
+    "minimum_latitude": -40,
+    "maximum_latitude": -20,
+}
+
+
+class CopernicusMarineProvider:
+    """Fetch subsets from CMEMS with copernicusmarine.subset."""
+
+    def __init__(self, username=None, password=None):
+        self.username = username or os.getenv("CMEMS_USERNAME")
+        self.password = password or os.getenv("CMEMS_PASSWORD")
+
+    def subset(self, dataset_id: str, variables: list, start: datetime, end: datetime,
+               output_directory: str, output_filename: str, bbox: dict = BBOX) -> str:
+        """Download [start, end] into output_directory/output_filename and return its path."""
+        import copernicusmarine
+
+        copernicusmarine.subset(
+            dataset_id=dataset_id,
+            variables=variables,
+            **bbox,
+            start_datetime=f"{start.strftime('%Y-%m-%d')}T00:00:00",
+            end_datetime=f"{end.strftime('%Y-%m-%d')}T00:00:00",
+            output_directory=output_directory,
+            output_filename=output_filename,
+            username=self.username,
+            password=self.password,
+        )
+        return os.path.join(output_directory, output_filename)
+
+    def time_coverage(self, dataset_id: str, variables: list, bbox: dict = BBOX):
+        """
+        (first, last) timestamps of the dataset, read from its metadata: the
+        lazily opened dataset only fetches its coordinate arrays.
+        """
+        import copernicusmarine
+
+        ds = copernicusmarine.open_dataset(
+            dataset_id=dataset_id,
+            variables=variables[:1],
+            **bbox,
+            username=self.username,
+            password=self.password,
+        )
+        with ds:
+            times = ds["time"].values
+            return pd.Timestamp(times[0]), pd.Timestamp(times[-1])
+
+
+class LocalFakeProvider:
+    """
+    Serve subsets out of a local dataset (a netCDF/Zarr path or an open
+    xarray.Dataset) with the same interface as CopernicusMarineProvider.
+    Raises ValueError when the requested range holds no data, as CMEMS does.
+    Requests are served one at a time: fetch_partitions() calls subset()
+    from several threads, and the netCDF/HDF5 library is not thread-safe.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.calls = []  # (dataset_id, start, end) of every request served
+        self._lock = threading.Lock()
+
+    def _open(self) -> xr.Dataset:
+        if isinstance(self.source, xr.Dataset):
+            return self.source
+        if str(self.source).endswith(".zarr"):
+            return xr.open_zarr(self.source)
+        return xr.open_dataset(self.source)
+
+    def time_coverage(self, dataset_id: str, variables: list, bbox: dict = BBOX):
+        times = self._open()["time"].values
+        return pd.Timestamp(times[0]), pd.Timestamp(times[-1])
+
+    def subset(self, dataset_id: str, variables: list, start: datetime, end: datetime,
+               output_directory: str, output_filename: str, bbox: dict = BBOX) -> str:
+        with self._lock:
+            self.calls.append((dataset_id, start, end))
+            ds = self._open()[variables]
+            ds = select_bbox(ds.sel(time=slice(start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))), bbox)
+            if ds.sizes.get("time", 0) == 0:
+                raise ValueError(f"No {dataset_id} data between {start:%Y-%m-%d} and {end:%Y-%m-%d}")
+
+            path = os.path.join(output_directory, output_filename)
+            ds.to_netcdf(path)
+            return path
+
+
+def latest_available_day(provider, dataset_id: str, variables: list, cache_file: str = None,
+                         ttl: int = AVAILABILITY_TTL) -> datetime:
+    """
+    Last day with data in `dataset_id`, from the provider's time coverage.
+    The answer is cached in `cache_file` (JSON, keyed by dataset) for `ttl`
+    seconds so repeated runs do not query the catalogue each time.
+    """
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except ValueError:
+            cache = {}
+        entry = cache.get(dataset_id)
+        if entry and time.time() - entry["checked"] < ttl:
+            return datetime.fromisoformat(entry["last_day"])
+
+    _, last = provider.time_coverage(dataset_id, variables)
+    last_day = last.normalize().to_pydatetime()
+    if cache_file:
+        cache[dataset_id] = {"last_day": last_day.isoformat(), "checked": time.time()}
+        tmp_path = cache_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=1)
+        os.replace(tmp_path, cache_file)
+    return last_day
+
+
+def daily_filename(dataset_id: str, day: datetime) -> str:
+    return f"{dataset_id}_multi-vars_{day.strftime('%Y-%m-%d')}.nc"
+
+
+def download_latest_day(provider, dataset_id: str, variables: list, output_directory: str,
+                        cache_file: str = None, max_lookback_days: int = 7, bbox: dict = BBOX,
+                        storage: str = "native"):
+    """
+    Append the most recent day of `dataset_id` to its consolidated store,
+    <output_directory>/<dataset_id>.zarr (see catalog.py).
+
+    The day comes from latest_available_day(), so normally exactly one
+    subset request is made; if the store already holds it, none. The subset
+    is written to a temporary directory and appended in place; a failed
+    append is rolled back, so a failed run never damages the store. A new
+    store is created with the profiles.py `storage` encoding ("float32" or
+    "int16"), after importing any per-day files left by earlier versions.
+    Without catalogue metadata it falls back to trying today and up to
+    `max_lookback_days` earlier days.
+
+    Returns the store path, or None if nothing could be fetched.
+    """
+    from catalog import Catalog
+
+    catalog = Catalog(output_directory, dataset_id)
+    legacy_pattern = f"{dataset_id}_multi-vars_*.nc"
+    if not catalog.exists() and catalog.import_files(legacy_pattern, variables, storage):
+        print(f"📥 Imported the existing daily files into {catalog.store}")
+    for old in glob.glob(os.path.join(output_directory, legacy_pattern)):
+        os.remove(old)
+        print(f"🗑️ Removed previous file: {old}")
+
+    try:
+        candidates = [latest_available_day(provider, dataset_id, variables, cache_file)]
+    except Exception as e:
+        print(f"⚠️ Could not read the time coverage of {dataset_id} ({e}). Probing day by day...")
+        today = datetime.combine(datetime.today().date(), datetime.min.time())
+        candidates = [today - timedelta(days=n) for n in range(max_lookback_days)]
+
+    latest = catalog.latest_date()
+    for day in candidates:
+        if latest is not None and latest.normalize() >= pd.Timestamp(day):
+            print(f"✅ {catalog.store} already holds {latest:%Y-%m-%d}. Nothing to download.")
+            return catalog.store
+
+        print(f"🌍 Fetching {dataset_id} for {day:%Y-%m-%d}...")
+        tmp_dir = tempfile.mkdtemp(prefix="subset-", dir=output_directory)
+        try:
+            path = provider.subset(dataset_id, variables, day, day, tmp_dir,
+                                   daily_filename(dataset_id, day), bbox=bbox)
+            with xr.open_dataset(path) as ds:
+                catalog.append(ds, storage)
+        except Exception as e:
+            print(f"❌ No data available for {day:%Y-%m-%d} ({e}).")
+            continue
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        print(f"✅ Data successfully appended for {day:%Y-%m-%d}.")
+        return catalog.store
+
+    print("⚠️ No recent data available. Keeping the existing store.")
+    return None
@@ -0,0 +1,178 @@
+"""
+Incremental marine heatwave event tracking (Hobday et al. 2016, 2018).
+
+A marine heatwave is a run of at least MIN_DURATION days with SST above the
+seasonal 90th percentile threshold; two events separated by at most MAX_GAP
+days are joined into one, gap days included. Intensity is SST minus the
+seasonal mean climatology, and the category (1 moderate, 2 strong,
+3 severe, 4 extreme) is the highest daily multiple of the threshold
+exceedance (threshold minus mean) reached during the event.
+
+Instead of redetecting events from the full history, a compact per-pixel
+state is kept next to the long record (long-record/mhw_state.nc) and
+advanced one day at a time with vectorized numpy updates:
+
+    ev_*    the latest event: duration (days), cumulative and maximum
+            intensity, peak category
+    pend_*  days since that event's last day, with their intensity
+            statistics, in case a new event joins it
+    run_*   the current run of days above the threshold
+
+Replaying the whole record from an empty state (rebuild=True) gives the
+same state as advancing it daily. The state records the fingerprints of the
+threshold and seasonal mean it was computed with (climatology.py), and is
+rebuilt when either climatology changes, e.g. when the baseline rolls over.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from climatology import hobday_doy
+
+MIN_DURATION = 5  # days above the threshold for a run to become an event
+MAX_GAP = 2  # events separated by at most this many days are joined
+DAYS_PER_READ = 32  # days of the record loaded at once when advancing
+CATEGORIES = {1: "Moderate", 2: "Strong", 3: "Severe", 4: "Extreme"}
+
+# name: (dtype, initial value)
+STATE = {
+    "ev_duration": (np.int16, 0),
+    "ev_cum": (np.float32, 0.0),
+    "ev_max": (np.float32, -np.inf),
+    "ev_ratio": (np.float32, -np.inf),
+    "pend_days": (np.int16, 0),
+    "pend_cum": (np.float32, 0.0),
+    "pend_max": (np.float32, -np.inf),
+    "pend_ratio": (np.float32, -np.inf),
+    "run_days": (np.int16, 0),
+    "run_cum": (np.float32, 0.0),
+    "run_max": (np.float32, -np.inf),
+    "run_ratio": (np.float32, -np.inf),
+}
+
+
+def empty_state(latitude, longitude) -> xr.Dataset:
+    shape = (len(latitude), len(longitude))
+    return xr.Dataset(
+        {name: (("latitude", "longitude"), np.full(shape, initial, dtype=dtype))
+         for name, (dtype, initial) in STATE.items()},
+        coords={"latitude": latitude, "longitude": longitude},
+        attrs={"last_time": "", "min_duration": MIN_DURATION, "max_gap": MAX_GAP},
+    )
+
+
+def advance(state: dict, sst: np.ndarray, threshold: np.ndarray, seas: np.ndarray):
+    """
+    Advance the per-pixel `state` arrays (modified in place) by one day of
+    SST, with that day's threshold and seasonal mean, all (latitude,
+    longitude) in °C.
+    """
+    above = sst > threshold  # False where SST is missing
+    anomaly = np.nan_to_num(sst - seas, nan=0.0, neginf=0.0, posinf=0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.nan_to_num(anomaly / (threshold - seas), nan=0.0, neginf=0.0, posinf=0.0)
+
+    # Pixels whose event included yesterday: above extends it, below ends it
+    ongoing = (state["ev_duration"] > 0) & (state["pend_days"] == 0)
+    extend = ongoing & above
+    state["ev_duration"][extend] += 1
+    state["ev_cum"][extend] += anomaly[extend]
+    state["ev_max"][extend] = np.maximum(state["ev_max"][extend], anomaly[extend])
+    state["ev_ratio"][extend] = np.maximum(state["ev_ratio"][extend], ratio[extend])
+
+    # Everywhere else the day is pending: it only counts if a run qualifies
+    pending = ~extend
+    state["pend_days"][pending] += 1
+    state["pend_cum"][pending] += anomaly[pending]
+    state["pend_max"][pending] = np.maximum(state["pend_max"][pending], anomaly[pending])
+    state["pend_ratio"][pending] = np.maximum(state["pend_ratio"][pending], ratio[pending])
+
+    grow = pending & above
+    state["run_days"][grow] += 1
+    state["run_cum"][grow] += anomaly[grow]
+    state["run_max"][grow] = np.maximum(state["run_max"][grow], anomaly[grow])
+    state["run_ratio"][grow] = np.maximum(state["run_ratio"][grow], ratio[grow])
+    for name in ("run_days", "run_cum", "run_max", "run_ratio"):
+        state[name][~above] = STATE[name][1]
+
+    # A run reaching MIN_DURATION becomes an event, joined to the previous
+    # one when the gap between them is at most MAX_GAP days
+    qualified = pending & (state["run_days"] == MIN_DURATION)
+    join = qualified & (state["ev_duration"] > 0) & (state["pend_days"] - state["run_days"] <= MAX_GAP)
+    new = qualified & ~join
+    state["ev_duration"][join] += state["pend_days"][join]
+    state["ev_cum"][join] += state["pend_cum"][join]
+    state["ev_max"][join] = np.maximum(state["ev_max"][join], state["pend_max"][join])
+    state["ev_ratio"][join] = np.maximum(state["ev_ratio"][join], state["pend_ratio"][join])
+    state["ev_duration"][new] = state["run_days"][new]
+    state["ev_cum"][new] = state["run_cum"][new]
+    state["ev_max"][new] = state["run_max"][new]
+    state["ev_ratio"][new] = state["run_ratio"][new]
+    for name in ("pend_days", "pend_cum", "pend_max", "pend_ratio"):
+        state[name][qualified] = STATE[name][1]
+
+
+def update_events(path: str, sst: xr.DataArray, threshold_doy: xr.DataArray, seas_doy: xr.DataArray,
+                  rebuild: bool = False) -> xr.Dataset:
+    """
+    Advance the event state in `path` over the days of `sst` (time,
+    latitude, longitude, in °C) after its last day, or replay every day
+    from an empty state with `rebuild`. The thresholds and seasonal mean are
+    (doy, latitude, longitude) Hobday climatologies; a state saved with other
+    climatologies (their "fingerprint" attrs) is rebuilt. Saves and returns
+    the state.
+    """
+    fingerprints = {"threshold_fingerprint": threshold_doy.attrs.get("fingerprint", ""),
+                    "seas_fingerprint": seas_doy.attrs.get("fingerprint", "")}
+    ds = None
+    if not rebuild and os.path.exists(path):
+        with xr.open_dataset(path) as saved:
+            ds = saved.load()
+        if any(ds.attrs.get(name, "") != value for name, value in fingerprints.items()):
+            print("🔄 Climatology changed since the heatwave event state was saved, rebuilding it...")
+            ds = None
+    if ds is None:
+        ds = empty_state(sst["latitude"].values, sst["longitude"].values)
+        ds.attrs.update(fingerprints)
+    if ds.attrs["last_time"]:
+        sst = sst.sel(time=sst["time"] > np.datetime64(ds.attrs["last_time"]))
+    times = pd.DatetimeIndex(sst["time"].values)
+    if len(times) == 0:
+        print(f"✅ Heatwave events already tracked through {ds.attrs['last_time'][:10]}.")
+        return ds
+
+    print(f"🌡️ Tracking heatwave events over {len(times)} days from {times[0]:%Y-%m-%d}...")
+    state = {name: ds[name].values for name in STATE}
+    threshold_doy = threshold_doy.transpose("doy", "latitude", "longitude").values
+    seas_doy = seas_doy.transpose("doy", "latitude", "longitude").values
+    sst = sst.transpose("time", "latitude", "longitude")
+    for start in range(0, len(times), DAYS_PER_READ):
+        block = sst.isel(time=slice(start, start + DAYS_PER_READ)).values.astype(np.float32)
+        for day, doy in zip(block, hobday_doy(times[start:start + DAYS_PER_READ])):
+            advance(state, day, threshold_doy[doy - 1], seas_doy[doy - 1])
+
+    for name in STATE:
+        ds[name].values = state[name]
+    ds.attrs["last_time"] = str(times[-1])
+    tmp_path = path + ".tmp"
+    ds.to_netcdf(tmp_path)
+    os.replace(tmp_path, path)
+    return ds
+
+
+def current_events(ds: xr.Dataset) -> xr.Dataset:
+    """
+    Maps of the events ongoing on the state's last day: duration (days),
+    cumulative (°C days) and maximum (°C) intensity and category 1-4. NaN
+    where there is no ongoing event.
+    """
+    ongoing = (ds["ev_duration"] > 0) & (ds["pend_days"] == 0)
+    category = np.clip(np.floor(ds["ev_ratio"]), 1, 4)
+    return xr.Dataset({
+        "duration": ds["ev_duration"].where(ongoing),
+        "cumulative_intensity": ds["ev_cum"].where(ongoing),
+        "max_intensity": ds["ev_max"].where(ongoing),
+        "category": category.where(ongoing),
+    })
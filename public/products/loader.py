@@ -0,0 +1,74 @@
+"""
+Shared lazy loading for the product generators.
+
+open_product() opens a netCDF file, a list of files or a Zarr store with
+xarray's CF decoding, which applies scale_factor/add_offset and masks
+_FillValue/missing_value exactly once. Only the requested variables, time
+range and bounding box are selected, everything stays lazy (dask), and
+floating-point variables are cast to float32. The generators must not scale
+or compare against fill values again: the values they get are physical
+values with NaN where data is missing.
+"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def select_bbox(ds, bbox: dict):
+    """Select a CMEMS-style bbox, whether latitude is ascending or descending."""
+    if not bbox:
+        return ds
+    lat = ds["latitude"].values
+    lat_slice = slice(bbox["minimum_latitude"], bbox["maximum_latitude"])
+    if lat.size > 1 and lat[0] > lat[-1]:
+        lat_slice = slice(lat_slice.stop, lat_slice.start)
+    return ds.sel(
+        longitude=slice(bbox["minimum_longitude"], bbox["maximum_longitude"]),
+        latitude=lat_slice,
+    )
+
+
+def select_time(ds, time):
+    """
+    `time` is None (everything), a (start, end) tuple or slice of dates
+    (inclusive), a single date, or "latest" for the last time step. Single
+    dates and "latest" keep a time dimension of length one.
+    """
+    if time is None:
+        return ds
+    if isinstance(time, str) and time == "latest":
+        return ds.isel(time=[-1])
+    if isinstance(time, tuple):
+        time = slice(*time)
+    if isinstance(time, slice):
+        start = None if time.start is None else pd.Timestamp(time.start)
+        stop = None if time.stop is None else pd.Timestamp(time.stop)
+        return ds.sel(time=slice(start, stop))
+    return ds.sel(time=[pd.Timestamp(time)])
+
+
+def open_product(source, variables: list, time=None, bbox: dict = None, chunks=None,
+                 dtype=np.float32) -> xr.Dataset:
+    """
+    Lazily open `variables` of `source` (a netCDF path, a list of netCDF
+    paths or a .zarr store), decoded once and cast to `dtype`, restricted to
+    `time` (see select_time) and `bbox`. `chunks` are dask chunks; by
+    default the file's own chunking.
+    """
+    chunks = {} if chunks is None else chunks
+    if isinstance(source, (list, tuple)):
+        ds = xr.open_mfdataset(sorted(source), combine="by_coords", chunks=chunks)
+    elif str(source).rstrip("/").endswith(".zarr"):
+        ds = xr.open_zarr(source, chunks=chunks)
+    else:
+        ds = xr.open_dataset(source, chunks=chunks)
+
+    missing = [name for name in variables if name not in ds]
+    if missing:
+        raise KeyError(f"❌ Variables {', '.join(missing)} not found in {source}")
+
+    ds = select_bbox(select_time(ds[variables], time), bbox)
+    for name in variables:
+        if ds[name].dtype.kind == "f" and ds[name].dtype != dtype:
+            ds[name] = ds[name].astype(dtype)
+    return ds
@@ -0,0 +1,302 @@
+"""
+Incremental long-record store for the CMEMS satellite products.
+
+The long record lives in one Zarr store per dataset
+(<long-record dir>/<dataset_id>.zarr), chunked in time and in space tiles so
+per-pixel reductions over the whole record can read it tile by tile. Each update reads the last timestamp
+already in the store and asks the provider only for the days after it, so a
+daily run transfers one day instead of the whole record.
+
+Long gaps (the initial backfill, or catching up after an outage) are split
+into yearly or monthly partitions that are fetched concurrently into
+<dataset_id>.partitions/ and merged into the store in time order. Partitions
+already on disk are not fetched again, so a failure only costs the
+partitions that failed.
+"""
+import glob
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+import xarray as xr
+import zarr
+
+from cmems import BBOX
+from profiles import storage_encoding
+
+TIME_CHUNK = 32  # days per Zarr chunk along time
+SPACE_CHUNK = 100  # grid cells per Zarr chunk along latitude and longitude
+PARTITION_MIN_DAYS = 62  # gaps longer than this are fetched in partitions
+
+# One dask chunk over the whole grid per time block: it covers whole store
+# tiles, so no two dask chunks ever write to the same Zarr chunk
+_WHOLE_GRID = {"latitude": -1, "longitude": -1}
+
+# netCDF storage settings that do not carry over to Zarr
+_NETCDF_ONLY_ENCODING = ("chunksizes", "contiguous", "zlib", "complevel", "shuffle",
+                         "fletcher32", "source", "original_shape", "compression",
+                         "preferred_chunks", "szip", "zstd", "bzip2", "blosc",
+                         "endian", "least_significant_digit", "quantize_mode",
+                         "significant_digits", "chunks")
+
+
+def store_path(directory: str, dataset_id: str) -> str:
+    return os.path.join(directory, f"{dataset_id}.zarr")
+
+
+def daily_files_pattern(dataset_id: str) -> str:
+    """
+    Glob of the daily netCDF files of `dataset_id` as written by
+    copernicusmarine.subset and download_latest_day(); it leaves out the
+    monthly means and station caches kept in the same directory.
+    """
+    return f"{dataset_id}_multi-vars_*.nc"
+
+
+def check_daily(ds: xr.Dataset, source: str):
+    """Raise ValueError unless the time steps of `ds` are consecutive days, without gaps or repeats."""
+    times = pd.DatetimeIndex(ds["time"].values).sort_values()
+    steps = times[1:] - times[:-1]
+    if len(steps) and (steps != pd.Timedelta(days=1)).any():
+        raise ValueError(f"❌ {source} is not a gap-free daily record "
+                         f"(time steps from {steps.min()} to {steps.max()})")
+
+
+def last_time(store: str):
+    """Last timestamp in `store` as a pandas Timestamp, or None if it does not exist."""
+    if not os.path.exists(store):
+        return None
+    with xr.open_zarr(store) as ds:
+        if ds.sizes.get("time", 0) == 0:
+            return None
+        return pd.Timestamp(ds["time"].values[-1])
+
+
+def _rollback(store: str, length: int):
+    """Truncate every time-dimensioned array of `store` back to `length` steps."""
+    with xr.open_zarr(store) as ds:
+        names = [name for name, var in ds.variables.items() if var.dims[:1] == ("time",)]
+    group = zarr.open_group(store, mode="r+")
+    for name in names:
+        array = group[name]
+        if array.shape[0] != length:
+            array.resize((length,) + array.shape[1:])
+    zarr.consolidate_metadata(store)
+
+
+def append_to_store(ds: xr.Dataset, store: str, time_chunk: int = TIME_CHUNK,
+                    storage: str = "native") -> int:
+    """
+    Append the time steps of `ds` newer than the store's last timestamp.
+    Creates the store on first use, with the profiles.py `storage` encoding;
+    later appends keep the store's encoding. Returns the number of days
+    written.
+
+    Dask chunks are aligned with the store's time chunks so appends never
+    share a Zarr chunk between writers, and a failed append is rolled back
+    so the store is never left with variables of different lengths. Input
+    that is not daily (e.g. monthly means) or has missing days raises
+    ValueError.
+    """
+    check_daily(ds, f"Data appended to {store}")
+    last = last_time(store)
+    if last is not None:
+        ds = ds.sel(time=ds["time"] > last.to_datetime64())
+    if ds.sizes.get("time", 0) == 0:
+        return 0
+
+    ds = ds.sortby("time")
+    for name in ds.variables:
+        for key in _NETCDF_ONLY_ENCODING:
+            ds[name].encoding.pop(key, None)
+
+    if last is None:
+        encoding = storage_encoding(ds, storage, zarr=True)
+        for name, var in ds.data_vars.items():
+            if "time" in var.dims:
+                encoding.setdefault(name, {})["chunks"] = tuple(
+                    time_chunk if dim == "time" else min(size, SPACE_CHUNK) if dim in ("latitude", "longitude")
+                    else size for dim, size in zip(var.dims, var.shape))
+        ds.chunk({"time": time_chunk, **_WHOLE_GRID}).to_zarr(store, mode="w", encoding=encoding)
+        return ds.sizes["time"]
+
+    with xr.open_zarr(store) as existing:
+        length = existing.sizes["time"]
+    # Fill the store's partial last chunk first, then whole chunks
+    first = min(time_chunk - length % time_chunk, ds.sizes["time"])
+    rest = ds.sizes["time"] - first
+    chunks = (first,) + (time_chunk,) * (rest // time_chunk) + ((rest % time_chunk,) if rest % time_chunk else ())
+    try:
+        ds.chunk({"time": chunks, **_WHOLE_GRID}).to_zarr(store, append_dim="time")
+    except Exception:
+        _rollback(store, length)
+        raise
+    return ds.sizes["time"]
+
+
+def seed_from_files(store: str, files: list, variables: list = None, storage: str = "native") -> int:
+    """Import existing long-record netCDF files into a new store, oldest first."""
+    written = 0
+    for path in sorted(files):
+        with xr.open_dataset(path) as ds:
+            check_daily(ds, path)
+            written += append_to_store(ds[variables] if variables else ds, store, storage=storage)
+        print(f"📥 Imported {path} into {store}")
+    return written
+
+
+def _subset_with_lookback(provider, dataset_id: str, variables: list, start: datetime,
+                          end: datetime, output_directory: str, max_lookback_days: int, bbox: dict):
+    """
+    Request [start, end], stepping `end` back a day at a time while the
+    provider has no data. Returns (path, end) or (None, None).
+    """
+    for days_back in range(max_lookback_days):
+        if start.date() > end.date():
+            break
+        print(f"Attempting to fetch data from {start:%Y-%m-%d} to {end:%Y-%m-%d}...")
+        try:
+            path = provider.subset(dataset_id, variables, start, end, output_directory,
+                                   f"{dataset_id}_{start:%Y%m%d}_{end:%Y%m%d}.nc", bbox=bbox)
+            return path, end
+        except Exception as e:
+            print(f"No data available up to {end:%Y-%m-%d} ({e}). Trying the previous day...")
+            end -= timedelta(days=1)
+    return None, None
+
+
+def partition_range(start: datetime, end: datetime, freq: str = "YS") -> list:
+    """
+    Split [start, end] into consecutive inclusive (start, end) blocks at
+    pandas `freq` boundaries ("YS" yearly, "MS" monthly, ...).
+    """
+    edges = [edge.to_pydatetime() for edge in pd.date_range(start, end, freq=freq) if edge > start]
+    starts = [start] + edges
+    ends = [edge - timedelta(days=1) for edge in edges] + [end]
+    return list(zip(starts, ends))
+
+
+def fetch_partitions(directory: str, dataset_id: str, variables: list, start: datetime,
+                     end: datetime, provider, freq: str = "YS", workers: int = 4,
+                     retries: int = 3, max_lookback_days: int = 30, bbox: dict = BBOX) -> list:
+    """
+    Fetch [start, end] as `freq` partitions over a pool of `workers` threads.
+    Failed partitions are retried up to `retries` rounds; partitions already in
+    <directory>/<dataset_id>.partitions/ are reused. Only the final
+    partition steps its end date back when the newest days are not out yet.
+
+    Returns a time-ordered list of partition paths, None where a partition
+    still failed.
+    """
+    part_dir = os.path.join(directory, f"{dataset_id}.partitions")
+    os.makedirs(part_dir, exist_ok=True)
+    blocks = partition_range(start, end, freq)
+    done = {}
+
+    for name in os.listdir(part_dir):
+        for block in blocks[:-1]:
+            if name == f"{dataset_id}_{block[0]:%Y%m%d}_{block[1]:%Y%m%d}.nc":
+                done[block] = os.path.join(part_dir, name)
+
+    def fetch(block):
+        final = block == blocks[-1]
+        tmp_dir = tempfile.mkdtemp(prefix="subset-", dir=part_dir)
+        try:
+            path, _ = _subset_with_lookback(provider, dataset_id, variables, block[0], block[1], tmp_dir,
+                                            max_lookback_days if final else 1, bbox)
+            if path is None:
+                return None
+            target = os.path.join(part_dir, os.path.basename(path))
+            os.replace(path, target)
+            return target
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for attempt in range(1, retries + 1):
+            todo = [block for block in blocks if block not in done]
+            if not todo:
+                break
+            print(f"📦 Fetching {len(todo)} of {len(blocks)} partitions (attempt {attempt}/{retries})...")
+            for block, path in zip(todo, pool.map(fetch, todo)):
+                if path:
+                    done[block] = path
+
+    failed = [block for block in blocks if block not in done]
+    if failed:
+        print(f"⚠️ {len(failed)} partitions still failing, first from {failed[0][0]:%Y-%m-%d}.")
+    return [done.get(block) for block in blocks]
+
+
+def merge_partitions(store: str, paths: list, storage: str = "native") -> int:
+    """
+    Append partition files to `store` in order, one lazily opened partition
+    at a time, stopping at the first missing one so the store stays
+    contiguous in time. Merged partition files are deleted.
+    """
+    written = 0
+    for path in paths:
+        if path is None:
+            break
+        with xr.open_dataset(path, chunks={"time": TIME_CHUNK}) as ds:
+            written += append_to_store(ds, store, storage=storage)
+        os.remove(path)
+    return written
+
+
+def update_long_record(directory: str, dataset_id: str, variables: list, first_date: datetime,
+                       provider, end_date: datetime = None, max_lookback_days: int = 30,
+                       bbox: dict = BBOX, partition_freq: str = None, workers: int = 4,
+                       storage: str = "native") -> int:
+    """
+    Bring <directory>/<dataset_id>.zarr up to date and return the number of
+    days appended.
+
+    A missing store is first seeded from the daily files already in
+    `directory` (daily_files_pattern()), then filled from `first_date`. Later runs request only the
+    days after the last timestamp on disk. If the provider has no data up to
+    `end_date` (default today), the end date steps back one day at a time,
+    up to `max_lookback_days`.
+
+    With `partition_freq` set, gaps longer than PARTITION_MIN_DAYS are fetched
+    with fetch_partitions() over `workers` threads and merged in time order.
+    A new store is written with the profiles.py `storage` encoding.
+    """
+    store = store_path(directory, dataset_id)
+    if last_time(store) is None:
+        seeds = glob.glob(os.path.join(directory, daily_files_pattern(dataset_id)))
+        if seeds:
+            seed_from_files(store, seeds, variables, storage)
+
+    last = last_time(store)
+    start = first_date if last is None else last.normalize().to_pydatetime() + timedelta(days=1)
+    end = end_date or datetime.today()
+
+    if start.date() > end.date():
+        print(f"✅ Long record already up to date (last day {start - timedelta(days=1):%Y-%m-%d}).")
+        return 0
+
+    if partition_freq and (end - start).days > PARTITION_MIN_DAYS:
+        paths = fetch_partitions(directory, dataset_id, variables, start, end, provider,
+                                 freq=partition_freq, workers=workers,
+                                 max_lookback_days=max_lookback_days, bbox=bbox)
+        written = merge_partitions(store, paths, storage)
+        print(f"Data successfully appended from {start:%Y-%m-%d} ({written} days).")
+        return written
+
+    tmp_dir = tempfile.mkdtemp(prefix="subset-", dir=directory)
+    try:
+        path, end = _subset_with_lookback(provider, dataset_id, variables, start, end, tmp_dir,
+                                          max_lookback_days, bbox)
+        if path is None:
+            print(f"No recent data available in the past {max_lookback_days} days. Keeping the existing store.")
+            return 0
+        with xr.open_dataset(path) as ds:
+            written = append_to_store(ds, store, storage=storage)
+        print(f"Data successfully appended from {start:%Y-%m-%d} to {end:%Y-%m-%d} ({written} days).")
+        return written
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
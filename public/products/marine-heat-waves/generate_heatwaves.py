@@ -1,14 +1,35 @@
-import xarray as xr
 import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
 import numpy as np
-import plotly.express as px
-import plotly.io as pio
 import os
-import glob
+import sys
 import socket
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from catalog import Catalog  # noqa: E402
+from chunked import compute, spatial_chunks  # noqa: E402
+from climatology import hobday_doy, load_or_build_seasonal_mean, load_or_build_threshold  # noqa: E402
+from cmems import SST_DATASET  # noqa: E402
+from heatwave_events import CATEGORIES, current_events, update_events  # noqa: E402
+from long_record import daily_files_pattern  # noqa: E402
+from render import interactive_map, render_jobs, static_map  # noqa: E402
+from sketch import sketch_path, sketch_threshold, sync_sketch  # noqa: E402
+from tiles import export_tiles  # noqa: E402
+
+# Hobday et al. (2016) threshold: 90th percentile of all values within
+# ±WINDOW_DAYS of each day of year, smoothed with a SMOOTH_DAYS moving mean
+MHW_PERCENTILE = 0.9
+WINDOW_DAYS = 5
+SMOOTH_DAYS = 31
+
+# "climatology": exact Hobday day-of-year threshold (climatology.py)
+# "sketch": calendar-month threshold from the streaming histogram sketch
+# (sketch.py), within 0.05 °C of the exact monthly quantile
+MHW_THRESHOLD = os.getenv("MHW_THRESHOLD", "climatology")
+
+# Event tracking state is advanced one day per run; MHW_REBUILD=1 replays
+# the whole long record from scratch instead
+MHW_REBUILD = os.getenv("MHW_REBUILD", "0") == "1"
+
 # Detect the environment based on hostname
 HOSTNAME = socket.gethostname()
 
@@ -24,38 +45,69 @@ else:
 # Define input directory
 input_directory = os.path.join(BASE_DIR, "long-record")
 
-# Find all .nc files in the long-record directory
-sst_files = [f for f in os.listdir(input_directory) if f.endswith('.nc')]
-sst_files.sort()
-
-# Use the most recent file as today's file
-todays_file = os.path.join(input_directory, sst_files[-1])
-
-# Use the first file in the list as the long-term record file
-long_record_file = os.path.join(input_directory, sst_files[0])
+# Consolidated long record kept up to date by download_long_record.py; its
+# last day is today's map. Per-day files left by older versions are imported
+# into it once.
+catalog = Catalog(input_directory, SST_DATASET)
+if not catalog.exists() and catalog.import_files(daily_files_pattern(SST_DATASET), ['analysed_sst']) == 0:
+    raise FileNotFoundError(f"❌ No SST long record found in {input_directory}")
 
-# Load datasets
-ds_todays = xr.open_dataset(todays_file)
-ds_long_record = xr.open_dataset(long_record_file)
+# Opened lazily in the store's chunks, decoded once and as float32 (see
+# loader.py); today's map only reads the chunks of the last day
+ds_long_record = catalog.select(['analysed_sst'])
+ds_todays = ds_long_record.isel(time=[-1])
 
 # Select SST variable and convert to degrees Celsius
 sst_original = ds_todays['analysed_sst'].isel(time=0) - 273.15
 sst_long_record = ds_long_record['analysed_sst'] - 273.15
 
+# The whole record in space tiles, for the per-pixel climatologies, which
+# read it tile by tile
+sst_long_record_tiles = sst_long_record.chunk(spatial_chunks(sst_long_record.sizes['time']))
+
 # Extract coordinates
 lon = ds_todays['longitude']
 lat = ds_todays['latitude']
 
-# Handle fill values
-sst_original = sst_original.where(sst_original != -2147483647)
-sst_long_record = sst_long_record.where(sst_long_record != -2147483647)
-
-# Compute the 90th percentile threshold using long-term record
-sst_threshold = sst_long_record.quantile(0.9, dim='time')
-
-# Compute marine heatwave as SST exceeding the 90th percentile
+if MHW_THRESHOLD == "sketch":
+    # Monthly 90th percentile from the per-pixel histograms next to the long
+    # record; only the days not yet counted are read
+    sketch_file = sketch_path(input_directory, SST_DATASET)
+    sync_sketch(sketch_file, sst_long_record)
+    sst_threshold = sketch_threshold(sketch_file, MHW_PERCENTILE, ds_todays['time'].values[0])
+else:
+    # Seasonal 90th percentile threshold from the long-term record. It is cached
+    # under long-record/climatology/ and only rebuilt when its inputs change.
+    sst_threshold_doy = load_or_build_threshold(
+        sst_long_record_tiles.rename('analysed_sst'),
+        os.path.join(input_directory, "climatology"),
+        q=MHW_PERCENTILE,
+        window=WINDOW_DAYS,
+        smooth=SMOOTH_DAYS,
+    )
+    sst_threshold = sst_threshold_doy.sel(doy=int(hobday_doy(ds_todays['time'].values)[0]))
+
+    # Event statistics (duration, intensity, category) from the persisted
+    # per-pixel state, advanced over the days not yet tracked
+    sst_seasonal_mean_doy = load_or_build_seasonal_mean(
+        sst_long_record_tiles.rename('analysed_sst'),
+        os.path.join(input_directory, "climatology"),
+        window=WINDOW_DAYS,
+        smooth=SMOOTH_DAYS,
+    )
+    mhw_state = update_events(
+        os.path.join(input_directory, "mhw_state.nc"),
+        sst_long_record,
+        sst_threshold_doy,
+        sst_seasonal_mean_doy,
+        rebuild=MHW_REBUILD,
+    )
+    mhw_events = current_events(mhw_state)
+
+# Compute marine heatwave as SST exceeding the 90th percentile (°C above it)
+sst_original = compute(sst_original)
 marine_heatwave = sst_original - sst_threshold
-marine_heatwave = marine_heatwave.where(marine_heatwave > 0) - 273.15
+marine_heatwave = compute(marine_heatwave.where(marine_heatwave > 0))
 
 # Extract date string
 original_date_str = str(ds_todays['time'].values[0])[:10]
@@ -65,107 +117,61 @@ long_record_date_str = str(ds_long_record['time'].values[-1])[:10]
 print("original_date_str",original_date_str)
 print("long_record_date_str",long_record_date_str)
 
-# --- Static Plot: Sea Surface Temperature ---
-plt.figure(figsize=(8, 6))
-ax = plt.axes(projection=ccrs.PlateCarree())
-
-p1 = ax.pcolormesh(lon, lat, sst_original, cmap='jet', transform=ccrs.PlateCarree(), zorder=1)
-
-ax.coastlines(resolution='50m', color='black', linewidth=1, zorder=3)
-ax.add_feature(cfeature.BORDERS, linestyle=':', edgecolor='black', zorder=3)
-ax.add_feature(cfeature.LAND, color='saddlebrown', zorder=0)
-ax.set_title(f'Sea Surface Temperature (°C) ({long_record_date_str})', fontsize=14, pad=10)
-
-gl = ax.gridlines(draw_labels=True, linewidth=0.5, color='gray', alpha=0.5)
-gl.top_labels = False
-gl.right_labels = False
-
-cbar = plt.colorbar(p1, orientation='vertical', shrink=0.8, pad=0.05)
-cbar.set_label('SST (°C)')
-
-plt.savefig('sst_static.png', dpi=300, bbox_inches='tight')
-plt.close()
-
-# --- Static Plot: Marine Heatwave ---
-plt.figure(figsize=(8, 6))
-ax = plt.axes(projection=ccrs.PlateCarree())
-
-p2 = ax.pcolormesh(lon, lat, marine_heatwave, cmap='YlOrRd', transform=ccrs.PlateCarree(), zorder=1)
-
-ax.coastlines(resolution='50m', color='black', linewidth=1, zorder=3)
-ax.add_feature(cfeature.BORDERS, linestyle=':', edgecolor='black', zorder=3)
-ax.add_feature(cfeature.LAND, color='saddlebrown', zorder=0)
-ax.set_title(f'Marine Heatwave (SST > 90th Percentile)\n({long_record_date_str} vs Long-term Mean)', fontsize=14, pad=10)
-
-gl = ax.gridlines(draw_labels=True, linewidth=0.5, color='gray', alpha=0.5)
-gl.top_labels = False
-gl.right_labels = False
-
-cbar = plt.colorbar(p2, orientation='vertical', shrink=0.8, pad=0.05)
-cbar.set_label('Marine Heatwave (°C)')
-
-plt.savefig('marine_heatwave_static.png', dpi=300, bbox_inches='tight')
-plt.close()
-
-# --- Interactive Plotly Plots ---
-
-# Prepare data
+# --- Figures, rendered in parallel (see render.py) ---
 sst_original_data = sst_original.values
 marine_heatwave_data = marine_heatwave.values
-lon_values, lat_values = np.meshgrid(lon, lat)
+lon_values, lat_values = lon.values, lat.values
 
-# Flip latitude if needed
-if lat_values[0, 0] > lat_values[-1, 0]:
+# Flip latitude if needed (Plotly maps)
+if lat_values[0] > lat_values[-1]:
     sst_original_data = np.flipud(sst_original_data)
     marine_heatwave_data = np.flipud(marine_heatwave_data)
-    lat_values = np.flipud(lat_values)
-
-# Interactive SST plot
-fig1 = px.imshow(
-    sst_original_data,
-    labels={'color': 'SST (°C)'},
-    x=lon_values[0],
-    y=lat_values[:, 0],
-    color_continuous_scale='Jet',
-    aspect='auto',
-    origin='lower'
-)
-fig1.update_layout(
-    title={
-        'text': f'Sea Surface Temperature (°C) ({original_date_str})',
-        'y': 0.95,
-        'x': 0.5,
-        'xanchor': 'center',
-        'yanchor': 'top'
-    },
-    xaxis_title='Longitude',
-    yaxis_title='Latitude',
-    coloraxis_colorbar=dict(title='SST (°C)', title_side='right'),
-)
-
-# Interactive Marine Heatwave plot
-fig2 = px.imshow(
-    marine_heatwave_data,
-    labels={'color': 'Marine Heatwave (°C)'},
-    x=lon_values[0],
-    y=lat_values[:, 0],
-    color_continuous_scale='YlOrRd',
-    aspect='auto',
-    origin='lower'
-)
-fig2.update_layout(
-    title={
-        'text': f'Marine Heatwave (SST > 90th Percentile)\n({original_date_str} vs Long-term Mean)',
-        'y': 0.95,
-        'x': 0.5,
-        'xanchor': 'center',
-        'yanchor': 'top'
-    },
-    xaxis_title='Longitude',
-    yaxis_title='Latitude',
-    coloraxis_colorbar=dict(title='Marine Heatwave (°C)', title_side='right'),
-)
-
-# Save HTML versions
-pio.write_html(fig1, file='sst_map_interactive_sst.html', auto_open=False)
-pio.write_html(fig2, file='marine_heatwave_map_interactive_sst.html', auto_open=False)
+    lat_values = lat_values[::-1]
+
+title_style = {'fontsize': 14, 'pad': 10}
+jobs = [
+    static_map('sst_static.png', lon, lat, sst_original, 'jet',
+               f'Sea Surface Temperature (°C) ({long_record_date_str})', 'SST (°C)', title_kwargs=title_style),
+    static_map('marine_heatwave_static.png', lon, lat, marine_heatwave, 'YlOrRd',
+               f'Marine Heatwave (SST > 90th Percentile)\n({long_record_date_str} vs Long-term Mean)',
+               'Marine Heatwave (°C)', title_kwargs=title_style),
+]
+if MHW_THRESHOLD != "sketch":
+    jobs.append(static_map(
+        'marine_heatwave_category_static.png', lon, lat, mhw_events['category'],
+        plt.get_cmap('YlOrRd', len(CATEGORIES)),
+        f'Marine Heatwave Category ({long_record_date_str})\n'
+        f'longest ongoing event: {int(np.nan_to_num(mhw_events["duration"].max()))} days',
+        'Hobday category', vmin=0.5, vmax=len(CATEGORIES) + 0.5, title_kwargs=title_style,
+        colorbar_ticks=list(CATEGORIES), colorbar_ticklabels=list(CATEGORIES.values()),
+    ))
+
+
+def interactive_layout(title, colorbar_title):
+    return dict(
+        title={
+            'text': title,
+            'y': 0.95,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        },
+        xaxis_title='Longitude',
+        yaxis_title='Latitude',
+        coloraxis_colorbar=dict(title=colorbar_title, title_side='right'),
+    )
+
+
+jobs += [
+    interactive_map('sst_map_interactive_sst.html', lon_values, lat_values, sst_original_data, 'Jet', 'SST (°C)',
+                    layout=interactive_layout(f'Sea Surface Temperature (°C) ({original_date_str})', 'SST (°C)')),
+    interactive_map('marine_heatwave_map_interactive_sst.html', lon_values, lat_values, marine_heatwave_data,
+                    'YlOrRd', 'Marine Heatwave (°C)',
+                    layout=interactive_layout(
+                        f'Marine Heatwave (SST > 90th Percentile)\n({original_date_str} vs Long-term Mean)',
+                        'Marine Heatwave (°C)')),
+]
+render_jobs(jobs)
+
+# Map tiles for the website, when enabled (SOMISANA_TILES, see tiles.py)
+export_tiles({'mhw_intensity': (lon, lat, marine_heatwave)})
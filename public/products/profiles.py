@@ -0,0 +1,120 @@
+"""
+Download profiles: what each downstream product needs from CMEMS.
+
+The download scripts request the union of the variables and domains of the
+enabled products instead of every variable the dataset offers. Products are
+enabled with SOMISANA_PRODUCTS (comma separated, default: all), and
+SOMISANA_STORAGE selects how the files are kept on disk:
+
+    native   as delivered by CMEMS (default)
+    float32  float32, zlib-compressed
+    int16    scaled int16 with the SCALED_INT16 packing below, zlib-compressed
+"""
+import os
+from datetime import datetime
+
+from cmems import BBOX, SSH_DATASET, SST_DATASET
+
+# time: "daily" reads the latest daily file, "long_record" the Zarr store
+# starting at `history_start`
+PRODUCTS = {
+    "sst_anomaly": {  # satellite-sst/generate_adt_anomaly_sst.py
+        "dataset": SST_DATASET,
+        "variables": ["analysed_sst"],
+        "bbox": BBOX,
+        "time": "daily",
+    },
+    "marine_heatwaves": {  # marine-heat-waves/generate_heatwaves.py
+        "dataset": SST_DATASET,
+        "variables": ["analysed_sst"],
+        "bbox": BBOX,
+        "time": "long_record",
+        "history_start": datetime(2007, 1, 1),
+    },
+    "ssh_maps": {  # satellite-ssh/generate_adt_anomaly_ssh.py
+        "dataset": SSH_DATASET,
+        "variables": ["adt", "sla"],
+        "bbox": BBOX,
+        "time": "daily",
+    },
+    "ssh_long_record": {  # satellite-ssh long record: ADT/SLA and geostrophic currents
+        "dataset": SSH_DATASET,
+        "variables": ["adt", "sla", "ugos", "vgos"],
+        "bbox": BBOX,
+        "time": "long_record",
+        "history_start": datetime(datetime.today().year - 1, 1, 1),
+    },
+}
+
+# (scale_factor, add_offset) for int16 storage, in the decoded units
+SCALED_INT16 = {
+    "analysed_sst": (0.01, 273.15),  # K, ±327 K around 0 °C
+    "adt": (0.0001, 0.0),            # m
+    "sla": (0.0001, 0.0),            # m
+    "ugos": (0.0001, 0.0),           # m/s
+    "vgos": (0.0001, 0.0),           # m/s
+}
+
+STORAGE = os.getenv("SOMISANA_STORAGE", "native")
+
+
+def enabled_products() -> dict:
+    names = os.getenv("SOMISANA_PRODUCTS")
+    if not names:
+        return PRODUCTS
+    wanted = [name.strip() for name in names.split(",") if name.strip()]
+    unknown = set(wanted) - set(PRODUCTS)
+    if unknown:
+        raise KeyError(f"❌ Unknown products in SOMISANA_PRODUCTS: {', '.join(sorted(unknown))}")
+    return {name: PRODUCTS[name] for name in wanted}
+
+
+def download_request(dataset_id: str, time: str) -> dict:
+    """
+    Minimal request for `dataset_id` covering every enabled product with the
+    given time need: the union of their variables, the bounding box around
+    all their domains and, for long records, the earliest history start.
+    Returns None when no enabled product needs it.
+    """
+    profiles = [p for p in enabled_products().values()
+                if p["dataset"] == dataset_id and p["time"] == time]
+    if not profiles:
+        return None
+
+    variables = sorted({v for p in profiles for v in p["variables"]})
+    bbox = {
+        "minimum_longitude": min(p["bbox"]["minimum_longitude"] for p in profiles),
+        "maximum_longitude": max(p["bbox"]["maximum_longitude"] for p in profiles),
+        "minimum_latitude": min(p["bbox"]["minimum_latitude"] for p in profiles),
+        "maximum_latitude": max(p["bbox"]["maximum_latitude"] for p in profiles),
+    }
+    request = {"variables": variables, "bbox": bbox}
+    if time == "long_record":
+        request["first_date"] = min(p["history_start"] for p in profiles)
+    return request
+
+
+def storage_encoding(ds, storage: str = STORAGE, zarr: bool = False) -> dict:
+    """
+    Per-variable encoding implementing the `storage` mode for the data
+    variables of `ds`. netCDF output also gets zlib compression; Zarr
+    stores are compressed by default.
+    """
+    if storage == "native":
+        return {}
+    if storage not in ("float32", "int16"):
+        raise ValueError(f"❌ Unknown SOMISANA_STORAGE mode: {storage}")
+
+    encoding = {}
+    for name, var in ds.data_vars.items():
+        if storage == "int16" and name in SCALED_INT16:
+            scale, offset = SCALED_INT16[name]
+            enc = {"dtype": "int16", "scale_factor": scale, "add_offset": offset, "_FillValue": -32768}
+        elif var.dtype.kind == "f":
+            enc = {"dtype": "float32"}
+        else:
+            continue
+        if not zarr:
+            enc.update(zlib=True, complevel=4)
+        encoding[name] = enc
+    return encoding
@@ -0,0 +1,454 @@
+"""
+Parallel rendering of the product figures.
+
+The generators describe their figures as jobs, static Cartopy maps (PNG)
+and interactive Plotly maps (HTML), and hand them to render_jobs(). The
+jobs run on a pool of worker processes that is started once per run. The
+plotting libraries are imported and the basemaps loaded before the pool is
+forked, so every worker starts with them in memory and renders job after
+job. Per-job timings are printed.
+
+A job carries its data, limits and labels, so a figure rendered by a worker
+is the same file as one rendered in sequence (workers=1). Plotly HTML gets
+a div id derived from the file name instead of a random one, so the HTML is
+reproducible too.
+
+Interactive maps are written in one of two modes (SOMISANA_HTML_MODE):
+
+- "compact" (default): the page loads one shared plotly.js asset
+  (<PLOTLY_JS_DIR>/plotly-<version>.min.js, written once) instead of
+  embedding the bundle, and the grid is stored as base64 uint16 with a
+  scale and offset, decoded in the browser before plotting. With
+  SOMISANA_HTML_MAX_PIXELS set, grids larger than that are block-averaged
+  down to it first.
+- "standalone": plotly's own write_html, with plotly.js and the grid as
+  JSON text in every file.
+
+Outputs are cached (SOMISANA_RENDER_CACHE=0 turns this off). Each output
+directory keeps a .render_cache.json with a fingerprint for every file it
+rendered. The fingerprint covers the job (data, limits, labels, styling),
+the rendering code and the plotting library versions. A job whose
+fingerprint matches and whose file exists is skipped, so a run on the same
+day's data as the last one renders nothing. Hits and misses are reported.
+
+    python render.py [directory]    # HTML size and grid read time, standalone vs compact
+"""
+import base64
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chunked import FORK, WORKERS
+
+DPI = 300
+
+HTML_MODE = os.getenv("SOMISANA_HTML_MODE", "compact")
+HTML_MAX_PIXELS = int(os.getenv("SOMISANA_HTML_MAX_PIXELS", 0))  # 0: full resolution
+PLOTLY_JS_DIR = os.getenv("SOMISANA_PLOTLY_JS_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+RENDER_CACHE = os.getenv("SOMISANA_RENDER_CACHE", "1") != "0"
+RENDER_CACHE_FILE = ".render_cache.json"
+
+# Quantized grids: values map to 0..QUANT_FILL - 1, missing values to QUANT_FILL
+QUANT_FILL = np.iinfo(np.uint16).max
+
+COMPACT_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8" /></head>
+<body style="margin: 0;">
+<div id="{div_id}" class="plotly-graph-div" style="height: 100vh; width: 100%;"></div>
+<script src="{plotly_js}"></script>
+<script>
+(function () {{
+    var figure = {figure};
+    var grid = {grid};
+    var bytes = atob(grid.data), raw = new Uint8Array(bytes.length);
+    for (var i = 0; i < bytes.length; i++) raw[i] = bytes.charCodeAt(i);
+    var q = new Uint16Array(raw.buffer), z = [];
+    for (var r = 0; r < grid.shape[0]; r++) {{
+        var row = new Array(grid.shape[1]);
+        for (var c = 0; c < grid.shape[1]; c++) {{
+            var v = q[r * grid.shape[1] + c];
+            row[c] = v === grid.fill ? null : grid.offset + v * grid.scale;
+        }}
+        z.push(row);
+    }}
+    figure.data[0].z = z;
+    Plotly.newPlot("{div_id}", figure.data, figure.layout, {{responsive: true}});
+}})();
+</script>
+</body>
+</html>
+"""
+
+
+def static_map(output: str, lon, lat, field, cmap, title: str, label: str, vmin=None, vmax=None,
+               gridlines: bool = True, title_kwargs: dict = None, contours=None,
+               colorbar_ticks: list = None, colorbar_ticklabels: list = None) -> dict:
+    """
+    Job for a static map of `field` on the shared basemap, with a vertical
+    colorbar. `contours` are line levels drawn and labelled over the field.
+    """
+    return {
+        "kind": "static", "output": output,
+        "lon": np.asarray(lon), "lat": np.asarray(lat), "field": np.asarray(field),
+        "cmap": cmap, "title": title, "label": label, "vmin": vmin, "vmax": vmax,
+        "gridlines": gridlines, "title_kwargs": title_kwargs or {}, "contours": contours,
+        "colorbar_ticks": colorbar_ticks, "colorbar_ticklabels": colorbar_ticklabels,
+    }
+
+
+def interactive_map(output: str, lon, lat, field, colorscale: str, label: str, zmin=None, zmax=None,
+                    layout: dict = None) -> dict:
+    """
+    Job for a Plotly imshow map of `field` (latitude ascending), written as
+    HTML; `layout` is passed to update_layout().
+    """
+    return {
+        "kind": "interactive", "output": output,
+        "lon": np.asarray(lon), "lat": np.asarray(lat), "field": np.asarray(field),
+        "colorscale": colorscale, "label": label, "zmin": zmin, "zmax": zmax, "layout": layout,
+    }
+
+
+def _render_static(job: dict):
+    import cartopy.crs as ccrs
+    import matplotlib.pyplot as plt
+
+    from basemap import basemap_for_grid
+
+    lon, lat, field = job["lon"], job["lat"], job["field"]
+    fig, ax = basemap_for_grid(lon, lat).figure(gridlines=job["gridlines"])
+    p = ax.pcolormesh(lon, lat, field, cmap=job["cmap"], vmin=job["vmin"], vmax=job["vmax"],
+                      transform=ccrs.PlateCarree(), zorder=1)
+    if job["contours"] is not None:
+        cs = ax.contour(lon, lat, field, levels=job["contours"], colors='black', linewidths=0.8,
+                        transform=ccrs.PlateCarree(), zorder=2)
+        ax.clabel(cs, inline=True, fontsize=8, fmt='%1.1f', inline_spacing=5)
+    ax.set_title(job["title"], **job["title_kwargs"])
+
+    cbar = plt.colorbar(p, orientation='vertical', shrink=0.8, pad=0.05, ticks=job["colorbar_ticks"])
+    if job["colorbar_ticklabels"] is not None:
+        cbar.ax.set_yticklabels(job["colorbar_ticklabels"])
+    cbar.set_label(job["label"])
+
+    plt.savefig(job["output"], dpi=DPI, bbox_inches='tight')
+    plt.close(fig)
+
+
+def decimate(lon, lat, field, max_pixels: int):
+    """
+    Block means of (lon, lat, field) over the smallest square blocks that
+    bring the grid within `max_pixels`; missing values are left out of the
+    means. Grids already within the budget are returned as they are.
+    """
+    ny, nx = field.shape
+    factor = int(np.ceil(np.sqrt(ny * nx / max_pixels))) if max_pixels else 1
+    if factor <= 1:
+        return lon, lat, field
+    ny, nx = ny // factor * factor, nx // factor * factor
+    blocks = field[:ny, :nx].reshape(ny // factor, factor, nx // factor, factor)
+    finite = np.isfinite(blocks)
+    counts = finite.sum(axis=(1, 3))
+    sums = np.where(finite, blocks, 0).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return (lon[:nx].reshape(-1, factor).mean(axis=1), lat[:ny].reshape(-1, factor).mean(axis=1),
+            means.astype(field.dtype))
+
+
+def quantize(field) -> dict:
+    """
+    `field` as little-endian uint16 (base64) with the offset and scale that
+    decode it (value = offset + q * scale); missing values are QUANT_FILL.
+    """
+    field = np.asarray(field, dtype=np.float64)
+    finite = np.isfinite(field)
+    low, high = (field[finite].min(), field[finite].max()) if finite.any() else (0.0, 0.0)
+    scale = (high - low) / (QUANT_FILL - 1) or 1.0
+    q = np.full(field.shape, QUANT_FILL, dtype="<u2")
+    q[finite] = np.round((field[finite] - low) / scale)
+    return {
+        "shape": list(field.shape), "offset": float(low), "scale": float(scale), "fill": int(QUANT_FILL),
+        "data": base64.b64encode(q.tobytes()).decode("ascii"),
+    }
+
+
+def plotly_js_path(directory: str = None) -> str:
+    """The shared plotly.js asset of the installed plotly, written if missing."""
+    from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+    directory = directory or PLOTLY_JS_DIR
+    path = os.path.join(directory, f"plotly-{get_plotlyjs_version()}.min.js")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+        os.replace(tmp_path, path)
+    return path
+
+
+def _write_compact_html(fig, output: str, div_id: str):
+    import plotly.io as pio
+
+    grid = quantize(fig.data[0].z)
+    fig.data[0].z = None
+    plotly_js = os.path.relpath(plotly_js_path(), os.path.dirname(os.path.abspath(output)))
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(COMPACT_HTML.format(
+            div_id=div_id, plotly_js=plotly_js.replace(os.sep, "/"),
+            figure=pio.to_json(fig, validate=False), grid=json.dumps(grid),
+        ))
+
+
+def _render_interactive(job: dict, mode: str = None):
+    import plotly.express as px
+    import plotly.io as pio
+
+    mode = mode or HTML_MODE
+    lon, lat, field = job["lon"], job["lat"], job["field"]
+    if mode == "compact":
+        lon, lat, field = decimate(lon, lat, field, HTML_MAX_PIXELS)
+    fig = px.imshow(
+        field,
+        labels={'color': job["label"]},
+        x=lon,
+        y=lat,
+        color_continuous_scale=job["colorscale"],
+        aspect='auto',
+        origin='lower',
+        zmin=job["zmin"],
+        zmax=job["zmax"],
+    )
+    if job["layout"]:
+        fig.update_layout(**job["layout"])
+    div_id = os.path.splitext(os.path.basename(job["output"]))[0]
+    if mode == "compact":
+        _write_compact_html(fig, job["output"], div_id)
+    elif mode == "standalone":
+        pio.write_html(fig, file=job["output"], auto_open=False, div_id=div_id)
+    else:
+        raise ValueError(f"❌ Unknown SOMISANA_HTML_MODE: {mode}. Use compact or standalone.")
+
+
+_RENDERERS = {"static": _render_static, "interactive": _render_interactive}
+
+
+def _init_worker():
+    # Imported once per worker and reused by every job it renders
+    import matplotlib
+    matplotlib.use("Agg")
+    import cartopy.crs  # noqa: F401
+    import matplotlib.pyplot  # noqa: F401
+    import plotly.express  # noqa: F401
+
+
+def _prepare(jobs: list):
+    """
+    Import the plotting libraries and load the basemaps of the static jobs
+    in this process, so forked workers start with them already in memory.
+    The shared plotly.js asset is written here, before workers could race
+    to write it.
+    """
+    from basemap import basemap_for_grid
+
+    _init_worker()
+    for job in jobs:
+        if job["kind"] == "static":
+            basemap_for_grid(job["lon"], job["lat"])
+        elif HTML_MODE == "compact":
+            plotly_js_path()
+
+
+def _describe(value):
+    # JSON-able description of a job value for its fingerprint
+    import matplotlib.colors
+
+    if isinstance(value, matplotlib.colors.Colormap):
+        return {"cmap": value.name, "colors": _describe(value(np.linspace(0, 1, value.N)))}
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return {"dtype": array.dtype.str, "shape": array.shape, "sha256": hashlib.sha256(array.tobytes()).hexdigest()}
+    if isinstance(value, dict):
+        return {key: _describe(item) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_describe(item) for item in value]
+    return value
+
+
+def code_version() -> str:
+    """Hash of the rendering code, the plotting library versions and the output settings."""
+    import cartopy
+    import matplotlib
+    import plotly
+
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ("render.py", "basemap.py"):
+        with open(os.path.join(here, name), "rb") as f:
+            digest.update(f.read())
+    digest.update(json.dumps([matplotlib.__version__, cartopy.__version__, plotly.__version__,
+                              DPI, HTML_MODE, HTML_MAX_PIXELS]).encode())
+    return digest.hexdigest()
+
+
+def fingerprint(job: dict, version: str = None) -> str:
+    """Fingerprint of everything that goes into a job's output file."""
+    described = {key: _describe(value) for key, value in job.items() if key != "output"}
+    described["output"] = os.path.basename(job["output"])
+    described["code"] = version or code_version()
+    return hashlib.sha256(json.dumps(described, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _cache_path(output: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(output)), RENDER_CACHE_FILE)
+
+
+def _load_cache(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_cache(path: str, cache: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def render_job(job: dict) -> tuple:
+    """Render one job; returns (output, seconds, worker pid)."""
+    start = time.perf_counter()
+    _RENDERERS[job["kind"]](job)
+    return job["output"], time.perf_counter() - start, os.getpid()
+
+
+def render_jobs(jobs: list, workers: int = WORKERS, cache: bool = RENDER_CACHE) -> list:
+    """
+    Render `jobs` on up to `workers` processes (in this process for one
+    worker), print per-job timings and return them as (output, seconds,
+    worker pid). With `cache`, jobs whose output is up to date with their
+    fingerprint are skipped (and left out of the result). A failing job
+    raises its exception.
+    """
+    fingerprints, caches = {}, {}
+    if cache:
+        version = code_version()
+        misses = []
+        for job in jobs:
+            path = _cache_path(job["output"])
+            if path not in caches:
+                caches[path] = _load_cache(path)
+            fingerprints[job["output"]] = fingerprint(job, version)
+            name = os.path.basename(job["output"])
+            if caches[path].get(name) == fingerprints[job["output"]] and os.path.exists(job["output"]):
+                print(f"♻️ {name}: unchanged, skipped")
+            else:
+                misses.append(job)
+        print(f"♻️ Render cache: {len(jobs) - len(misses)} hits, {len(misses)} misses")
+        jobs = misses
+        if not jobs:
+            return []
+
+    workers = max(1, min(workers, len(jobs)))
+    start = time.perf_counter()
+    _prepare(jobs)
+    if workers == 1:
+        results = [render_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=FORK, initializer=_init_worker) as pool:
+            results = list(pool.map(render_job, jobs))
+    elapsed = time.perf_counter() - start
+
+    for output, seconds, pid in results:
+        print(f"🖼️ {os.path.basename(output)}: {seconds:.2f} s (worker {pid})")
+    print(f"✅ Rendered {len(jobs)} figures in {elapsed:.2f} s on {workers} workers "
+          f"({sum(seconds for _, seconds, _ in results):.2f} s of rendering)")
+
+    # Recorded only once every job has been rendered
+    for output in fingerprints:
+        caches[_cache_path(output)][os.path.basename(output)] = fingerprints[output]
+    for path, entries in caches.items():
+        _save_cache(path, entries)
+    return results
+
+
+def _read_standalone_grid(path: str):
+    # The grid as the page gets it from plotly's write_html: JSON text, or
+    # a base64 typed array from plotly 6 on
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    start = html.index("[", html.index("Plotly.newPlot("))
+    z = json.JSONDecoder().raw_decode(html, start)[0][0]["z"]
+    if isinstance(z, dict):
+        shape = [int(n) for n in z["shape"].split(",")]
+        return np.frombuffer(base64.b64decode(z["bdata"]), dtype=z["dtype"]).reshape(shape).astype(np.float64)
+    return np.array(z, dtype=np.float64)
+
+
+def _read_compact_grid(path: str):
+    # The grid as the page decodes it: base64 uint16, offset and scale
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    start = html.index("var grid = ") + len("var grid = ")
+    grid = json.loads(html[start:html.index(";\n", start)])
+    q = np.frombuffer(base64.b64decode(grid["data"]), dtype="<u2").reshape(grid["shape"])
+    return np.where(q == grid["fill"], np.nan, grid["offset"] + q * grid["scale"])
+
+
+def benchmark(directory: str, max_pixels: int = 100_000):
+    """
+    File size (raw and gzipped) of one interactive SST-sized map and the
+    time to get its grid back out of the page, standalone vs compact vs
+    compact decimated to `max_pixels`, written to `directory`.
+    """
+    import gzip
+
+    global HTML_MAX_PIXELS, PLOTLY_JS_DIR
+    from cmems import BBOX
+
+    lon = np.arange(BBOX["minimum_longitude"], BBOX["maximum_longitude"], 0.05)
+    lat = np.arange(BBOX["minimum_latitude"], BBOX["maximum_latitude"], 0.05)
+    field = (20 + 5 * np.add.outer(np.sin(np.radians(lat) * 20), np.cos(np.radians(lon) * 20))).astype(np.float32)
+    field[:40, :60] = np.nan
+    PLOTLY_JS_DIR = directory
+    print(f"⏱️ Benchmark: {field.shape[0]} x {field.shape[1]} grid, plotly.js {plotly_js_path()}")
+
+    sizes = {}
+    for label, mode, budget, read in (("standalone", "standalone", 0, _read_standalone_grid),
+                                      ("compact", "compact", 0, _read_compact_grid),
+                                      (f"compact, {max_pixels} px", "compact", max_pixels, _read_compact_grid)):
+        HTML_MAX_PIXELS = budget
+        job = interactive_map(os.path.join(directory, f"{mode}_{budget}.html"), lon, lat, field, "jet", "SST (°C)")
+        start = time.perf_counter()
+        _render_interactive(job, mode)
+        write = time.perf_counter() - start
+        with open(job["output"], "rb") as f:
+            raw = f.read()
+        start = time.perf_counter()
+        grid = read(job["output"])
+        decode = time.perf_counter() - start
+        sizes[label] = len(raw)
+        error = f", max error {np.nanmax(np.abs(grid - field)):.2g}" if grid.shape == field.shape else ""
+        print(f"📄 {label}: {len(raw) / 1e6:.2f} MB ({len(gzip.compress(raw)) / 1e6:.2f} MB gzipped), "
+              f"written in {write:.2f} s, grid {grid.shape[0]} x {grid.shape[1]} read back in {decode:.3f} s"
+              f"{error}")
+
+    shared = os.path.getsize(plotly_js_path())
+    print(f"✅ Six maps: {6 * sizes['standalone'] / 1e6:.1f} MB standalone, "
+          f"{(6 * sizes['compact'] + shared) / 1e6:.1f} MB compact (plotly.js shared, {shared / 1e6:.1f} MB, "
+          f"cached by the browser after the first map)")
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp(prefix="render_benchmark_"))
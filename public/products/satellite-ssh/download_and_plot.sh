@@ -41,22 +41,11 @@ cd "$(dirname "$0")"
 # Define the paths to your scripts
 DOWNLOAD_SCRIPT="download_ssh_cmems.py"
 PLOT_SCRIPT="generate_adt_anomaly_ssh.py"
+ANALYTICS_SCRIPT="generate_ssh_analytics.py"
 
-# Define the download directory and file pattern
-FILE_PATTERN="cmems_obs-sl_glo_phy-ssh_nrt_allsat-l4-duacs-0.125deg_P1D_multi-vars_*.nc"
-
-# Check for existing files before download
-echo "📂 Checking for existing files in $BASE_DIR"
-existing_files=($BASE_DIR/$FILE_PATTERN)
-
-# Remove old files before downloading new ones
-if [ -n "${existing_files[0]}" ]; then
-    echo "🗑️ Removing old files before download..."
-    rm -f "${existing_files[@]}"
-    echo "✅ Old files removed successfully."
-else
-    echo "⚠️ No old files found."
-fi
+# Old files are no longer removed here: the download script appends each
+# day to the dataset's consolidated store, so a failed download keeps the
+# last good day for plotting.
 
 # Execute the download script
 echo "📥 Running download script: $DOWNLOAD_SCRIPT"
@@ -76,6 +65,11 @@ python $PLOT_SCRIPT
 
 echo "🎉 Plot generation completed successfully."
 
+# Climatology anomaly, geostrophic speed and EKE from the long record; the
+# daily maps above do not depend on it, so a failure here is not fatal
+echo "📊 Running SSH analytics script: $ANALYTICS_SCRIPT"
+python $ANALYTICS_SCRIPT || echo "⚠️ SSH analytics failed. The daily maps are unaffected."
+
 # Deactivate the environment (optional)
 if [[ "$HOSTNAME" == "COMP000000183" ]]; then
     conda deactivate
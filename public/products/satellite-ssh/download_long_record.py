@@ -1,13 +1,17 @@
-import copernicusmarine
-from datetime import datetime, timedelta
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cmems import SSH_DATASET, CopernicusMarineProvider  # noqa: E402
+from long_record import update_long_record  # noqa: E402
+from profiles import STORAGE, download_request  # noqa: E402
 
 # Detect the environment based on hostname
 HOSTNAME = os.uname().nodename
 
 if HOSTNAME == "COMP000000183":
     print("Running on Local Machine:", HOSTNAME)
-    output_directory = "/home/nc.memela/Projects/tmp/sat-ssh/"
+    output_directory = "/home/nc.memela/Projects/tmp/sat-ssh/long-record/"
 else:
     print("Running on Server:", HOSTNAME)
     output_directory = "/home/nkululeko/tmp/sat-ssh/long-record/"  # Updated path with "/ocean-access" removed
@@ -19,40 +23,25 @@ os.makedirs(output_directory, exist_ok=True)
 os.environ['CMEMS_USERNAME'] = 'nmemela1'  # Replace with your actual username
 os.environ['CMEMS_PASSWORD'] = 'Memela161'  # Replace with your actual password
 
-# Define the date range: start of last year to the most recent available day
-start_date = datetime(datetime.today().year - 1, 1, 1)
-current_date = datetime.today()
+# Variables, domain and start date come from the enabled products (see
+# profiles.py). Only the days after the last one already in the store are
+# requested, so a daily run transfers a single day.
+request = download_request(SSH_DATASET, "long_record")
+if request is None:
+    print("No enabled product uses the SSH long record. Nothing to download.")
+    sys.exit(0)
+
 max_lookback_days = 30  # Check up to 30 days back if today's data is not available
 
-# Attempt to fetch data from the start of last year to the most recent day available
-data_downloaded = False
-
-for days_back in range(max_lookback_days):
-    end_date_str = current_date.strftime('%Y-%m-%d')
-    print(f"Attempting to fetch data from {start_date.strftime('%Y-%m-%d')} to {end_date_str}...")
-
-    try:
-        # Attempt to fetch the data
-        copernicusmarine.subset(
-            dataset_id="cmems_obs-sl_glo_phy-ssh_nrt_allsat-l4-duacs-0.125deg_P1D",
-            variables=["adt", "err_sla", "err_ugosa", "err_vgosa", "flag_ice", "sla", "ugos", "ugosa", "vgos", "vgosa"],
-            minimum_longitude=10,
-            maximum_longitude=40,
-            minimum_latitude=-40,
-            maximum_latitude=-20,
-            start_datetime=f"{start_date.strftime('%Y-%m-%d')}T00:00:00",
-            end_datetime=f"{end_date_str}T00:00:00",
-            output_directory=output_directory,
-            username=os.getenv('CMEMS_USERNAME'),
-            password=os.getenv('CMEMS_PASSWORD')
-        )
-        print(f"Data successfully downloaded from {start_date.strftime('%Y-%m-%d')} to {end_date_str}.")
-        data_downloaded = True
-        break  # Exit loop if data is downloaded successfully
-
-    except Exception as e:
-        print(f"No data available up to {end_date_str}. Trying the previous day...")
-        current_date -= timedelta(days=1)
-
-if not data_downloaded:
-    print("No recent data available in the past 30 days. Keeping the existing file.")
+update_long_record(
+    output_directory,
+    SSH_DATASET,
+    variables=request["variables"],
+    first_date=request["first_date"],
+    provider=CopernicusMarineProvider(),
+    max_lookback_days=max_lookback_days,
+    partition_freq="YS",  # backfills run as yearly partitions in parallel
+    workers=4,
+    bbox=request["bbox"],
+    storage=STORAGE,
+)
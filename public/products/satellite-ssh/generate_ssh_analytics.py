@@ -0,0 +1,91 @@
+import numpy as np
+import os
+import sys
+import socket
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from chunked import compute, spatial_chunks  # noqa: E402
+from climatology import hobday_doy, load_or_build_seasonal_mean  # noqa: E402
+from catalog import Catalog  # noqa: E402
+from cmems import SSH_DATASET  # noqa: E402
+from render import render_jobs, static_map  # noqa: E402
+
+# Day-of-year climatology of the long record: ±WINDOW_DAYS around each day,
+# smoothed with a SMOOTH_DAYS moving mean (as for the SST thresholds)
+WINDOW_DAYS = 5
+SMOOTH_DAYS = 31
+
+# --- Detect environment ---
+HOSTNAME = socket.gethostname()
+
+if HOSTNAME == "COMP000000183":
+    print("📌 Running on Local Machine")
+    LONG_RECORD_DIR = "/home/nc.memela/Projects/tmp/sat-ssh/long-record"
+elif HOSTNAME == "ocimsvaps.ocean.gov.za":
+    print("📌 Running on Server")
+    LONG_RECORD_DIR = "/home/nkululeko/tmp/sat-ssh/long-record"
+else:
+    raise EnvironmentError("🚨 Unknown environment. Please configure the correct LONG_RECORD_DIR.")
+
+# --- Open the SSH long record lazily ---
+catalog = Catalog(LONG_RECORD_DIR, SSH_DATASET)
+if not catalog.exists():
+    raise FileNotFoundError(f"❌ No SSH long record at {catalog.store}. Run download_long_record.py first.")
+
+# Today's day from the store's chunks; the climatologies read the whole
+# record in space tiles
+ds_long_record = catalog.select(['adt', 'ugos', 'vgos'])
+ds_today = ds_long_record.isel(time=-1)
+ds_long_record = ds_long_record.chunk(spatial_chunks(ds_long_record.sizes['time']))
+plot_date_str = str(ds_today['time'].values)[:10]
+doy_today = int(hobday_doy([ds_today['time'].values])[0])
+print(f"📂 Using {catalog.store} up to {plot_date_str}")
+
+# --- Day-of-year climatologies, cached under climatology/ ---
+# Built once from the complete years of the record; daily runs only open the
+# cached files
+cache_dir = os.path.join(LONG_RECORD_DIR, "climatology")
+climatology = {
+    name: load_or_build_seasonal_mean(
+        ds_long_record[name], cache_dir, window=WINDOW_DAYS, smooth=SMOOTH_DAYS
+    ).sel(doy=doy_today, drop=True)
+    for name in ('adt', 'ugos', 'vgos')
+}
+
+# --- Derived fields for today ---
+adt = compute(ds_today['adt'])
+ugos = compute(ds_today['ugos'])
+vgos = compute(ds_today['vgos'])
+
+# ADT anomaly relative to the day-of-year climatology (m)
+adt_anomaly = adt - climatology['adt']
+
+# Geostrophic speed (m/s)
+geostrophic_speed = np.hypot(ugos, vgos)
+
+# Eddy kinetic energy from the geostrophic velocity anomalies (cm²/s²)
+u_anomaly = ugos - climatology['ugos']
+v_anomaly = vgos - climatology['vgos']
+eke = 0.5 * (u_anomaly ** 2 + v_anomaly ** 2) * 1e4
+
+lon = ds_today['longitude']
+lat = ds_today['latitude']
+
+# --- Figures, rendered in parallel (see render.py) ---
+adt_vmax = float(np.nanmax(np.abs(adt_anomaly)))
+render_jobs([
+    # Static Plot 1: ADT anomaly vs climatology
+    static_map('adt_climatology_anomaly_static_ssh.png', lon, lat, adt_anomaly, 'RdBu_r',
+               f'ADT Anomaly vs Day-of-Year Climatology - {plot_date_str}', 'ADT Anomaly (m)',
+               vmin=-adt_vmax, vmax=adt_vmax),
+    # Static Plot 2: Geostrophic speed
+    static_map('geostrophic_speed_static_ssh.png', lon, lat, geostrophic_speed, 'viridis',
+               f'Geostrophic Current Speed - {plot_date_str}', 'Speed (m/s)',
+               vmin=0, vmax=float(np.nanpercentile(geostrophic_speed, 99))),
+    # Static Plot 3: Eddy kinetic energy
+    static_map('eke_static_ssh.png', lon, lat, eke, 'magma',
+               f'Eddy Kinetic Energy - {plot_date_str}', 'EKE (cm²/s²)',
+               vmin=0, vmax=float(np.nanpercentile(eke, 99))),
+])
+
+print("✅ SSH analytics complete! Climatology anomaly, geostrophic speed and EKE have been plotted.")
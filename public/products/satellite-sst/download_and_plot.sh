@@ -38,22 +38,9 @@ cd "$(dirname "$0")"
 DOWNLOAD_SCRIPT="download_sst_cmems.py"
 PLOT_SCRIPT="generate_adt_anomaly_sst.py"
 
-# Define the download directory and file pattern dynamically
-DOWNLOAD_DIRECTORY="$BASE_DIR"
-FILE_PATTERN="METOFFICE-GLO-SST-L4-NRT-OBS-SST-V2_multi-vars_*.nc"
-
-# Check for existing files before download
-echo "📂 Checking for existing files in $DOWNLOAD_DIRECTORY"
-existing_files=($DOWNLOAD_DIRECTORY/$FILE_PATTERN)
-
-# Remove old files before downloading new ones
-if [ -n "${existing_files[0]}" ]; then
-    echo "🗑️ Removing old files before download..."
-    rm -f "${existing_files[@]}"
-    echo "✅ Old files removed successfully."
-else
-    echo "✅ No old files found."
-fi
+# Old files are no longer removed here: the download script appends each
+# day to the dataset's consolidated store, so a failed download keeps the
+# last good day for plotting.
 
 # Execute the download script
 echo "⬇️ Running download script: $DOWNLOAD_SCRIPT"
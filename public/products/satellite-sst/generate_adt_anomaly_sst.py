@@ -1,14 +1,19 @@
 import xarray as xr
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
 import numpy as np
-import plotly.express as px
-import plotly.io as pio
 import glob
 import os
+import sys
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from chunked import compute, spatial_chunks  # noqa: E402
+from catalog import Catalog  # noqa: E402
+from climatology import load_or_build_monthly  # noqa: E402
+from cmems import SST_DATASET  # noqa: E402
+from loader import open_product  # noqa: E402
+from render import interactive_map, render_jobs, static_map  # noqa: E402
+from tiles import export_tiles  # noqa: E402
+
 # Detect environment based on hostname
 HOSTNAME = os.uname().nodename
 
@@ -21,59 +26,68 @@ elif HOSTNAME == "ocimsvaps.ocean.gov.za":
 else:
     print("this is nonsense, what HOST is this?")
 
-# Find NetCDF files using glob
-original_files = glob.glob(f"{DATA_DIR}/*.nc")  # Daily SST
+# Batch mode: with SST_ANOMALY_START (and optionally SST_ANOMALY_END), both
+# YYYY-MM-DD, anomalies are computed for every day of the range in one pass
+# and written as a time series instead of plotting the latest day, e.g.
+#   SST_ANOMALY_START=2025-01-01 SST_ANOMALY_END=2025-03-31 python generate_adt_anomaly_sst.py
+BATCH_START = os.getenv("SST_ANOMALY_START")
+BATCH_END = os.getenv("SST_ANOMALY_END", BATCH_START)
+
+# Daily SST is read through the catalogs of the consolidated stores (the
+# daily downloads and the long record), the monthly means from their file
+daily_catalog = Catalog(DATA_DIR, SST_DATASET)
+long_record_catalog = Catalog(f"{DATA_DIR}/long-record", SST_DATASET)
 monthly_files = glob.glob(f"{DATA_DIR}/long-record/METOFFICE-GLO-SST-L4-NRT-OBS-SST-V2_monthly_*.nc")  # Monthly mean SST
 
-# Ensure at least one file is found
-if not original_files:
-    raise FileNotFoundError(f"❌ No daily SST NetCDF files found in {DATA_DIR}")
+# Ensure the inputs exist
+if not daily_catalog.exists() and not (BATCH_START and long_record_catalog.exists()):
+    raise FileNotFoundError(f"❌ No daily SST store found in {DATA_DIR}")
 
 if not monthly_files:
     raise FileNotFoundError(f"❌ No monthly SST NetCDF files found in {DATA_DIR}/long-record/")
 
-# Select the first file in each case
-original_file = original_files[0]  # Daily SST
 monthly_file = monthly_files[0]    # Monthly mean SST
-
-print(f"📂 Using daily SST file: {original_file}")
 print(f"📂 Using monthly mean SST file: {monthly_file}")
 
-# Open datasets
-ds_original = xr.open_dataset(original_file)
-ds_monthly = xr.open_dataset(monthly_file)
-
-# Ensure 'analysed_sst' exists in both datasets
-if 'analysed_sst' not in ds_original or 'analysed_sst' not in ds_monthly:
-    raise KeyError("❌ Variable 'analysed_sst' not found in one of the datasets.")
+# Open the inputs lazily, decoded once (scale, offset and fill values) and
+# as float32
+if BATCH_START:
+    # Every day of the range, from the long record when there is one
+    catalog = long_record_catalog if long_record_catalog.exists() else daily_catalog
+    print(f"📂 Using daily SST from {catalog.store} ({BATCH_START} to {BATCH_END})")
+    ds_original = catalog.select(['analysed_sst'], time=(BATCH_START, BATCH_END))
+    if ds_original.sizes['time'] == 0:
+        raise FileNotFoundError(f"❌ No daily SST between {BATCH_START} and {BATCH_END}")
+else:
+    print(f"📂 Using daily SST for {daily_catalog.latest_date():%Y-%m-%d} from {daily_catalog.store}")
+    ds_original = daily_catalog.select(['analysed_sst'], time="latest")
 
-# Convert SST to Celsius using scale factor & offset
-scale_factor = ds_original['analysed_sst'].attrs.get('scale_factor', 1)
-offset = ds_original['analysed_sst'].attrs.get('add_offset', 0)
+# The monthly record in space tiles with the full time series
+with xr.open_dataset(monthly_file) as ds:
+    monthly_chunks = spatial_chunks(ds.sizes['time'])
+ds_monthly = open_product(monthly_file, ['analysed_sst'], chunks=monthly_chunks)
 
-analysed_sst_original = (ds_original['analysed_sst'].isel(time=0) * scale_factor) + offset - 273.15
-analysed_sst_monthly = (ds_monthly['analysed_sst'] * scale_factor) + offset - 273.15
+# Convert SST to Celsius
+analysed_sst_days = ds_original['analysed_sst'] - 273.15
+analysed_sst_original = analysed_sst_days.isel(time=0)
+analysed_sst_monthly = ds_monthly['analysed_sst'] - 273.15
 
 # Extract coordinates
 lon = ds_original['longitude']
 lat = ds_original['latitude']
 
-# Handle fill values
-fill_value = ds_original['analysed_sst'].attrs.get('_FillValue', -32768)
-analysed_sst_original = analysed_sst_original.where(analysed_sst_original != fill_value)
-analysed_sst_monthly = analysed_sst_monthly.where(analysed_sst_monthly != fill_value)
-
 # --- Fully Dynamic Weighted Monthly Mean Transition ---
-def weighted_monthly_mean(time_array, monthly_data):
+def weighted_monthly_mean(time_array, monthly_climatology):
     """
-    Computes a dynamically weighted SST mean based on proximity to mid-month.
+    Computes a dynamically weighted SST mean based on proximity to mid-month,
+    from the cached (month, latitude, longitude) climatology, for every day
+    of `time_array` at once. Returns (time, latitude, longitude).
     Handles all month lengths, leap years, and missing months correctly.
     """
     time_index = pd.to_datetime(time_array.values)
 
     # Print debug info
     print("\n🕒 Daily SST Time Values:\n", time_index)
-    print("📅 Monthly SST Time Values:\n", monthly_data['time'].values[:5])  # Print first 5 timestamps
 
     month_days = time_index.days_in_month
     day_of_month = time_index.day
@@ -94,47 +108,73 @@ def weighted_monthly_mean(time_array, monthly_data):
     W_current[mask_after_mid] = 1 - ((day_of_month[mask_after_mid] - 15) / (month_days[mask_after_mid] - 15))
     W_next[mask_after_mid] = (day_of_month[mask_after_mid] - 15) / (month_days[mask_after_mid] - 15)
 
-    # Clip weights
-    W_prev = np.clip(W_prev, 0, 1)
-    W_current = np.clip(W_current, 0, 1)
-    W_next = np.clip(W_next, 0, 1)
+    # Clip weights (float32, like the climatology they weight)
+    W_prev = np.clip(W_prev, 0, 1).astype(np.float32)
+    W_current = np.clip(W_current, 0, 1).astype(np.float32)
+    W_next = np.clip(W_next, 0, 1).astype(np.float32)
 
-    # Convert to scalar integers
-    current_month = int(time_index.month[0])  # Extract single value
-    prev_month = int((time_index - pd.DateOffset(months=1)).month[0])
-    next_month = int((time_index + pd.DateOffset(months=1)).month[0])
+    # Month of each day and of its neighbours
+    current_month = time_index.month.values
+    prev_month = (time_index - pd.DateOffset(months=1)).month.values
+    next_month = (time_index + pd.DateOffset(months=1)).month.values
 
     # Debugging prints
-    print("\n📅 Current Month:", current_month)
-    print("📅 Previous Month:", prev_month)
-    print("📅 Next Month:", next_month)
-    # print("🔎 Monthly Data Unique Months:", np.unique(monthly_data['time'].dt.month))
+    print("\n📅 Current Month:", np.unique(current_month))
+    print("📅 Previous Month:", np.unique(prev_month))
+    print("📅 Next Month:", np.unique(next_month))
 
-    # Ensure selection works properly by using `.where()` instead of `.sel()`
-    historical_current = monthly_data.where(monthly_data['time'].dt.month == current_month, drop=True).mean(dim="time", skipna=True)
-    historical_prev = monthly_data.where(monthly_data['time'].dt.month == prev_month, drop=True).mean(dim="time", skipna=True)
-    historical_next = monthly_data.where(monthly_data['time'].dt.month == next_month, drop=True).mean(dim="time", skipna=True)
+    def along_time(values):
+        return xr.DataArray(values, dims="time", coords={"time": time_array.values})
 
-    # Debugging prints for dataset filtering
-    #print("\n🔍 Filtered Historical Current SST:\n", historical_current)
-    #print("🔍 Filtered Historical Previous SST:\n", historical_prev)
-    #print("🔍 Filtered Historical Next SST:\n", historical_next)
+    def monthly_means(months):
+        # Broadcast the cached climatology over time: one slice per day
+        return monthly_climatology.sel(month=along_time(months)).drop_vars("month")
 
-    # Compute weighted SST
-    smoothed_sst = (historical_prev * W_prev) + (historical_current * W_current) + (historical_next * W_next)
+    # Monthly means come from the cached climatology: no scan of the record
+    historical_current = monthly_means(current_month)
+    historical_prev = monthly_means(prev_month)
+    historical_next = monthly_means(next_month)
 
-    return smoothed_sst
+    # Compute weighted SST
+    smoothed_sst = (historical_prev * along_time(W_prev)) + (historical_current * along_time(W_current)) \
+        + (historical_next * along_time(W_next))
 
+    return smoothed_sst.transpose("time", ...)
 
 
 # -------------------- MAIN PROCESSING --------------------
 
+# 12-month climatology of the monthly record, built in one groupby pass and
+# cached under long-record/climatology/ until the monthly file changes
+sst_monthly_climatology = load_or_build_monthly(
+    analysed_sst_monthly.rename('analysed_sst'),
+    os.path.join(DATA_DIR, "long-record", "climatology"),
+    sources=[monthly_file],
+)
+
 # Apply the weighted transition for smoother anomalies
 print("🔍 Applying weighted monthly mean transition...")
-analysed_sst_smooth = weighted_monthly_mean(ds_original['time'], ds_monthly['analysed_sst'])
+analysed_sst_smooth = weighted_monthly_mean(ds_original['time'], sst_monthly_climatology)
+
+if BATCH_START:
+    # Whole range in one vectorized pass, written as a time series
+    analysed_sst_anomalies = analysed_sst_days - analysed_sst_smooth
+    output_directory = os.path.join(DATA_DIR, "anomaly")
+    os.makedirs(output_directory, exist_ok=True)
+    days = pd.to_datetime(ds_original['time'].values)
+    output_file = os.path.join(output_directory, f"sst_anomaly_{days[0]:%Y%m%d}_{days[-1]:%Y%m%d}.nc")
+    ds_anomaly = xr.Dataset({
+        'analysed_sst': analysed_sst_days.astype(np.float32).assign_attrs(units='degC'),
+        'analysed_sst_anomaly': analysed_sst_anomalies.astype(np.float32).assign_attrs(
+            units='degC', long_name='SST anomaly relative to the weighted monthly mean'),
+    })
+    compute(ds_anomaly).to_netcdf(output_file + ".tmp")
+    os.replace(output_file + ".tmp", output_file)
+    print(f"✅ Wrote {len(days)} days of SST anomalies to {output_file}")
+    sys.exit(0)
 
 # Compute the SST anomaly
-analysed_sst_anomaly = analysed_sst_original - analysed_sst_smooth
+analysed_sst_anomaly = compute(analysed_sst_original - analysed_sst_smooth.isel(time=0))
 
 # Extract date strings
 original_date_str = str(ds_original['time'].values[0])[:10]
@@ -142,64 +182,21 @@ anomaly_date_str = str(ds_monthly['time'].values[-1])[:10]
 
 # -------------------- PLOTTING --------------------
 
-# --- Static SST Plot ---
-plt.figure(figsize=(8, 6))
-ax = plt.axes(projection=ccrs.PlateCarree())
-
-p1 = ax.pcolormesh(lon, lat, analysed_sst_original, cmap='jet', transform=ccrs.PlateCarree(), zorder=1)
-ax.set_title(f'Sea Surface Temperature ({original_date_str})')
-
-cbar = plt.colorbar(p1, orientation='vertical', shrink=0.8, pad=0.05)
-cbar.set_label('SST (°C)')
-
-ax.coastlines(resolution='50m', color='black', linewidth=1, zorder=2)
-ax.add_feature(cfeature.BORDERS, linestyle=':', edgecolor='black', zorder=2)
-ax.add_feature(cfeature.LAND, color='saddlebrown', zorder=0)
-
-plt.savefig('analysed_sst_static.png', dpi=300, bbox_inches='tight')
-plt.close()
-
-# --- Static SST Anomaly Plot ---
-plt.figure(figsize=(8, 6))
-ax = plt.axes(projection=ccrs.PlateCarree())
-
-vmax = np.nanmax(np.abs(analysed_sst_anomaly))
-p2 = ax.pcolormesh(lon, lat, analysed_sst_anomaly, cmap='RdBu_r', vmin=-vmax, vmax=vmax, transform=ccrs.PlateCarree(), zorder=1)
-ax.set_title(f'SST Anomaly ({original_date_str} vs Weighted Monthly Mean)')
-
-cbar = plt.colorbar(p2, orientation='vertical', shrink=0.8, pad=0.05)
-cbar.set_label('SST Anomaly (°C)')
-
-ax.coastlines(resolution='50m', color='black', linewidth=1, zorder=2)
-ax.add_feature(cfeature.BORDERS, linestyle=':', edgecolor='black', zorder=2)
-ax.add_feature(cfeature.LAND, color='saddlebrown', zorder=0)
-
-plt.savefig('analysed_sst_anomaly_static.png', dpi=300, bbox_inches='tight')
-plt.close()
-
-# --- Interactive SST Plot ---
-fig1 = px.imshow(
-    analysed_sst_original.values,
-    labels={'color': 'SST (°C)'},
-    x=lon.values,
-    y=lat.values,
-    color_continuous_scale='Jet',
-    aspect='auto',
-    origin='lower'
-)
-
-# --- Interactive SST Anomaly Plot ---
-fig2 = px.imshow(
-    analysed_sst_anomaly.values,
-    labels={'color': 'SST Anomaly (°C)'},
-    x=lon.values,
-    y=lat.values,
-    color_continuous_scale='RdBu_r',
-    aspect='auto',
-    origin='lower'
-)
-pio.write_html(fig1, file='analysed_sst_map_interactive.html', auto_open=False)
-pio.write_html(fig2, file='analysed_sst_anomaly_map_interactive.html', auto_open=False)
+# Figures, rendered in parallel (see render.py)
+vmax = float(np.nanmax(np.abs(analysed_sst_anomaly)))
+render_jobs([
+    static_map('analysed_sst_static.png', lon, lat, analysed_sst_original, 'jet',
+               f'Sea Surface Temperature ({original_date_str})', 'SST (°C)', gridlines=False),
+    static_map('analysed_sst_anomaly_static.png', lon, lat, analysed_sst_anomaly, 'RdBu_r',
+               f'SST Anomaly ({original_date_str} vs Weighted Monthly Mean)', 'SST Anomaly (°C)',
+               vmin=-vmax, vmax=vmax, gridlines=False),
+    interactive_map('analysed_sst_map_interactive.html', lon, lat, analysed_sst_original, 'Jet', 'SST (°C)'),
+    interactive_map('analysed_sst_anomaly_map_interactive.html', lon, lat, analysed_sst_anomaly, 'RdBu_r',
+                    'SST Anomaly (°C)'),
+])
+
+# Map tiles for the website, when enabled (SOMISANA_TILES, see tiles.py)
+export_tiles({'sst': (lon, lat, analysed_sst_original), 'sst_anomaly': (lon, lat, analysed_sst_anomaly)})
 
 print("✅ Process complete! SST anomaly has been computed and plotted.")
 
@@ -0,0 +1,160 @@
+"""
+Streaming percentile sketch of the SST long record.
+
+Instead of keeping every day of every pixel in memory to take an exact
+quantile, the sketch keeps per-pixel, per-calendar-month histograms of SST
+in fixed BIN_WIDTH bins, as a uint16 Zarr array
+counts(month, bin, latitude, longitude) next to the long record
+(<long-record dir>/<dataset_id>.sketch.zarr). A new day only increments one
+bin per pixel, and sketches of disjoint periods (e.g. yearly partitions)
+merge by adding their counts.
+
+Error bound: for values inside [BIN_MIN, BIN_MAX), sketch_threshold()
+differs from the exact linearly interpolated quantile of the same days
+(np.quantile over every day of that calendar month) by at most
+BIN_WIDTH / 2, i.e. 0.05 °C. Each order statistic is replaced by the centre
+of its bin, and the interpolation between two of them keeps that bound.
+Values outside the range are clamped into the edge bins; sea water cannot
+be colder than BIN_MIN and the domain never reaches BIN_MAX.
+"""
+import os
+
+import dask.array
+import numpy as np
+import pandas as pd
+import xarray as xr
+import zarr
+
+from long_record import SPACE_CHUNK
+
+BIN_MIN = -2.5  # °C
+BIN_MAX = 35.0  # °C
+BIN_WIDTH = 0.1  # °C
+NBINS = int(round((BIN_MAX - BIN_MIN) / BIN_WIDTH))
+DIMS = ("month", "bin", "latitude", "longitude")
+
+
+def sketch_path(directory: str, dataset_id: str) -> str:
+    return os.path.join(directory, f"{dataset_id}.sketch.zarr")
+
+
+def create_sketch(path: str, latitude, longitude):
+    """Write an empty sketch for the grid; unwritten chunks read as zero counts."""
+    counts = dask.array.zeros((12, NBINS, len(latitude), len(longitude)), dtype=np.uint16,
+                              chunks=(1, NBINS, SPACE_CHUNK, SPACE_CHUNK))
+    ds = xr.Dataset(
+        {"counts": (DIMS, counts)},
+        coords={"month": np.arange(1, 13), "latitude": latitude, "longitude": longitude},
+        attrs={"bin_min": BIN_MIN, "bin_max": BIN_MAX, "bin_width": BIN_WIDTH,
+               "first_time": "", "last_time": ""},
+    )
+    ds.to_zarr(path, mode="w", compute=False)
+
+
+def _check_compatible(sketch: xr.Dataset, latitude, longitude):
+    if (sketch.attrs["bin_min"], sketch.attrs["bin_width"], sketch.sizes["bin"]) != (BIN_MIN, BIN_WIDTH, NBINS):
+        raise ValueError("❌ Sketch bins differ from BIN_MIN/BIN_WIDTH/NBINS; rebuild it.")
+    if not (np.array_equal(sketch["latitude"].values, latitude)
+            and np.array_equal(sketch["longitude"].values, longitude)):
+        raise ValueError("❌ Sketch grid differs from the long record grid; rebuild it.")
+
+
+def add_days(counts: np.ndarray, values: np.ndarray):
+    """Count the (time, latitude, longitude) °C `values` into one month's (bin, lat, lon) `counts`."""
+    for day in values:
+        valid = np.isfinite(day)
+        bins = np.clip(np.floor((day[valid] - BIN_MIN) / BIN_WIDTH), 0, NBINS - 1).astype(np.intp)
+        rows, cols = np.nonzero(valid)
+        counts[bins, rows, cols] += 1  # one value per pixel per day: no repeated indices
+
+
+def sync_sketch(path: str, da: xr.DataArray) -> int:
+    """
+    Add the days of `da` (time, latitude, longitude, in °C) that are newer
+    than the sketch's last day, creating the sketch if needed. The record is
+    read one calendar month at a time. Returns the number of days added.
+    """
+    if not os.path.exists(path):
+        create_sketch(path, da["latitude"].values, da["longitude"].values)
+    with xr.open_zarr(path) as sketch:
+        _check_compatible(sketch, da["latitude"].values, da["longitude"].values)
+        first, last = sketch.attrs["first_time"], sketch.attrs["last_time"]
+
+    if last:
+        da = da.sel(time=da["time"] > np.datetime64(last))
+    times = pd.DatetimeIndex(da["time"].values)
+    if len(times) == 0:
+        return 0
+
+    da = da.transpose("time", "latitude", "longitude")
+    months = times.month.values
+    for run in np.split(np.arange(len(times)), np.flatnonzero(np.diff(months)) + 1):
+        month = int(months[run[0]])
+        with xr.open_zarr(path) as sketch:
+            counts = sketch["counts"].sel(month=month).values
+        add_days(counts, da.isel(time=run).values.astype(np.float32))
+        xr.Dataset({"counts": (DIMS, counts[None])}).to_zarr(path, region={"month": slice(month - 1, month)})
+        first = first or str(times[run[0]])
+        zarr.open_group(path, mode="r+").attrs.update(first_time=first, last_time=str(times[run[-1]]))
+    print(f"📊 Added {len(times)} days to the sketch, now through {times[-1]:%Y-%m-%d}")
+    return len(times)
+
+
+def merge_sketches(paths: list, out: str):
+    """
+    Sum the counts of sketches built over disjoint periods (e.g. yearly
+    partitions of a backfill) into a new sketch at `out`.
+    """
+    sketches = [xr.open_zarr(path) for path in paths]
+    periods = sorted((s.attrs["first_time"], s.attrs["last_time"]) for s in sketches if s.attrs["last_time"])
+    for (_, end), (start, _) in zip(periods, periods[1:]):
+        if start <= end:
+            raise ValueError(f"❌ Sketch periods overlap ({start} <= {end}); days would be counted twice.")
+
+    lat, lon = sketches[0]["latitude"].values, sketches[0]["longitude"].values
+    for s in sketches:
+        _check_compatible(s, lat, lon)
+    create_sketch(out, lat, lon)
+    for m in range(12):
+        total = sum(s["counts"].isel(month=m).values.astype(np.uint32) for s in sketches)
+        if total.max() > np.iinfo(np.uint16).max:
+            raise OverflowError("❌ Merged sketch counts exceed uint16.")
+        xr.Dataset({"counts": (DIMS, total.astype(np.uint16)[None])}).to_zarr(out, region={"month": slice(m, m + 1)})
+    if periods:
+        zarr.open_group(out, mode="r+").attrs.update(first_time=periods[0][0], last_time=periods[-1][1])
+    for s in sketches:
+        s.close()
+
+
+def quantile_from_counts(counts: np.ndarray, q: float) -> np.ndarray:
+    """
+    Linearly interpolated `q` quantile of each pixel from its (bin, ...)
+    histogram, with every value taken at its bin centre. NaN where empty.
+    """
+    cum = np.cumsum(counts, axis=0, dtype=np.int32)
+    n = cum[-1]
+    h = (n - 1) * q
+    lo, hi = np.floor(h), np.ceil(h)
+
+    def order_statistic(rank):
+        return BIN_MIN + ((cum > rank).argmax(axis=0) + 0.5) * BIN_WIDTH
+
+    low = order_statistic(lo)
+    value = low + (h - lo) * (order_statistic(hi) - low)
+    return np.where(n > 0, value, np.nan).astype(np.float32)
+
+
+def sketch_threshold(path: str, q: float, day) -> xr.DataArray:
+    """`q` quantile (°C) of every pixel over the calendar month of `day`, read in row bands."""
+    month = pd.Timestamp(day).month
+    with xr.open_zarr(path) as sketch:
+        counts = sketch["counts"].sel(month=month)
+        nlat = sketch.sizes["latitude"]
+        result = np.empty((nlat, sketch.sizes["longitude"]), dtype=np.float32)
+        for start in range(0, nlat, SPACE_CHUNK):
+            rows = slice(start, min(start + SPACE_CHUNK, nlat))
+            result[rows] = quantile_from_counts(counts.isel(latitude=rows).values, q)
+        return xr.DataArray(result, dims=("latitude", "longitude"),
+                            coords={"latitude": sketch["latitude"].values,
+                                    "longitude": sketch["longitude"].values},
+                            name=f"analysed_sst_p{int(round(q * 100))}")
@@ -0,0 +1,105 @@
+"""
+Extract SST, SST anomaly, ADT and SLA time series at coastal stations.
+
+    python extract_station_series.py --stations "False Bay,Algoa Bay" --start 2024-01-01
+    python extract_station_series.py --point "Buoy=-34.4,18.3" --series sst,sst_anomaly --output buoy.nc
+    python extract_station_series.py --benchmark
+
+Series are read from the station caches next to the long records (see
+stations.py), which are brought up to date with the stores first.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cmems import SSH_DATASET, SST_DATASET  # noqa: E402
+from loader import open_product  # noqa: E402
+from long_record import store_path  # noqa: E402
+from stations import SERIES, STATIONS, extract, parse_stations, to_frame  # noqa: E402
+
+BENCHMARK_STATIONS = 20
+BENCHMARK_REPEATS = 5
+
+# Detect the environment based on hostname
+HOSTNAME = os.uname().nodename
+
+if HOSTNAME == "COMP000000183":
+    print("Running on Local Machine:", HOSTNAME)
+    BASE_DIR = "/home/nc.memela/Projects/tmp"
+else:
+    print("Running on Server:", HOSTNAME)
+    BASE_DIR = "/home/nkululeko/tmp"
+
+# Long-record directory of each dataset (see download_long_record.py)
+DIRECTORIES = {
+    SST_DATASET: os.path.join(BASE_DIR, "sat-sst", "long-record"),
+    SSH_DATASET: os.path.join(BASE_DIR, "sat-ssh", "long-record"),
+}
+
+
+def benchmark_stations() -> dict:
+    """The STATIONS plus points offshore of them, BENCHMARK_STATIONS in all."""
+    stations = dict(STATIONS)
+    for name, (lat, lon) in STATIONS.items():
+        if len(stations) == BENCHMARK_STATIONS:
+            break
+        stations[f"{name} offshore"] = (lat - 0.3, lon)
+    return stations
+
+
+def run_benchmark(series: list):
+    stations = benchmark_stations()
+    print(f"⏱️ Benchmark: {len(stations)} stations, series {', '.join(series)}")
+
+    start = time.perf_counter()
+    extract(stations, DIRECTORIES, series)
+    print(f"📍 Station caches up to date in {time.perf_counter() - start:.2f} s")
+
+    timings = []
+    for _ in range(BENCHMARK_REPEATS):
+        start = time.perf_counter()
+        ds = extract(stations, DIRECTORIES, series)
+        timings.append(time.perf_counter() - start)
+    print(f"✅ {len(stations)}-station extract of {ds.sizes['time']} days: "
+          f"{statistics.median(timings):.3f} s (median of {BENCHMARK_REPEATS})")
+
+    # The old way: nearest-neighbour .sel on the long record, one point at a time
+    sst = open_product(store_path(DIRECTORIES[SST_DATASET], SST_DATASET), ["analysed_sst"])["analysed_sst"]
+    start = time.perf_counter()
+    for lat, lon in stations.values():
+        np.asarray(sst.sel(latitude=lat, longitude=lon, method="nearest").values)
+    print(f"🐢 Per-point .sel of SST from the long record: {time.perf_counter() - start:.2f} s")
+
+
+parser = argparse.ArgumentParser(description="Extract time series at coastal stations from the long records.")
+parser.add_argument("--stations", help=f"comma-separated station names (default: all). Known: {', '.join(STATIONS)}")
+parser.add_argument("--point", action="append", default=[], help="extra point as Name=lat,lon (repeatable)")
+parser.add_argument("--series", default=",".join(SERIES), help=f"comma-separated series (default: {','.join(SERIES)})")
+parser.add_argument("--start", help="first date (YYYY-MM-DD)")
+parser.add_argument("--end", help="last date (YYYY-MM-DD)")
+parser.add_argument("--output", default="station_series.csv", help="output .csv or .nc file")
+parser.add_argument("--benchmark", action="store_true", help="time a 20-station extract and exit")
+args = parser.parse_args()
+
+series = [name.strip() for name in args.series.split(",") if name.strip()]
+
+if args.benchmark:
+    run_benchmark(series)
+    sys.exit(0)
+
+names = [name.strip() for name in args.stations.split(",")] if args.stations else None
+stations = parse_stations(names, args.point)
+time_range = (args.start, args.end) if args.start or args.end else None
+
+ds = extract(stations, DIRECTORIES, series, time=time_range)
+
+if args.output.endswith(".nc"):
+    ds.to_netcdf(args.output)
+else:
+    to_frame(ds).to_csv(args.output, index=False, float_format="%.4f")
+print(f"✅ Wrote {ds.sizes['time']} days at {ds.sizes['station']} stations to {args.output}")
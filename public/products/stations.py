@@ -0,0 +1,237 @@
+"""
+Station time series from the long records.
+
+Series at fixed coastal sites (STATIONS, or any named point) are served from
+a small per-dataset station cache next to the long record
+(<long-record dir>/<dataset_id>.stations.nc). It holds a (station, time) copy
+of the variables at the ocean pixel nearest to each station, plus their
+day-of-year seasonal mean there for anomalies, so an extraction is one small
+file read however long the record is.
+
+The cache is filled with one vectorized indexed read of the Zarr store for
+all stations at once, and afterwards only extended by the days appended to
+the store since. Asking for stations the cache does not hold rebuilds it for
+the union of the old and new stations.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from chunked import compute
+from climatology import default_baseline, doy_mean_block, hobday_doy
+from cmems import SSH_DATASET, SST_DATASET
+from loader import open_product, select_time
+from long_record import store_path
+
+# Day-of-year seasonal mean for the anomalies, as for the heatwave products
+WINDOW_DAYS = 5
+SMOOTH_DAYS = 31
+
+# name: (latitude, longitude)
+STATIONS = {
+    "Port Nolloth": (-29.25, 16.85),
+    "Lamberts Bay": (-32.10, 18.30),
+    "St Helena Bay": (-32.70, 18.05),
+    "Saldanha Bay": (-33.05, 17.90),
+    "Table Bay": (-33.85, 18.40),
+    "False Bay": (-34.25, 18.65),
+    "Walker Bay": (-34.50, 19.30),
+    "Mossel Bay": (-34.20, 22.20),
+    "Knysna": (-34.10, 23.10),
+    "Algoa Bay": (-33.90, 25.80),
+    "East London": (-33.05, 27.95),
+    "Durban": (-29.90, 31.10),
+}
+
+# series: (dataset, variable, offset added to the values, anomaly, units)
+SERIES = {
+    "sst": (SST_DATASET, "analysed_sst", -273.15, False, "°C"),
+    "sst_anomaly": (SST_DATASET, "analysed_sst", 0.0, True, "°C"),
+    "adt": (SSH_DATASET, "adt", 0.0, False, "m"),
+    "sla": (SSH_DATASET, "sla", 0.0, False, "m"),
+}
+
+
+def parse_stations(names: list = None, points: list = None) -> dict:
+    """
+    {name: (latitude, longitude)} for the named STATIONS (default: all of
+    them unless `points` are given) and `points` given as "Name=lat,lon".
+    """
+    stations = {}
+    if names is None and not points:
+        names = list(STATIONS)
+    for name in names or []:
+        if name not in STATIONS:
+            raise KeyError(f"❌ Unknown station: {name}. Known stations: {', '.join(STATIONS)}")
+        stations[name] = STATIONS[name]
+    for point in points or []:
+        name, _, position = point.partition("=")
+        try:
+            lat, lon = (float(value) for value in position.split(","))
+        except ValueError:
+            raise ValueError(f"❌ Points are given as Name=lat,lon, not {point!r}") from None
+        stations[name.strip()] = (lat, lon)
+    return stations
+
+
+def station_cache_path(directory: str, dataset_id: str) -> str:
+    return os.path.join(directory, f"{dataset_id}.stations.nc")
+
+
+def nearest_ocean(valid: np.ndarray, latitude: np.ndarray, longitude: np.ndarray, stations: dict):
+    """
+    (latitude, longitude) indices of the valid (ocean) pixel nearest to each
+    station, so sites on the coast do not land on a masked pixel.
+    """
+    iy, ix = np.nonzero(valid)
+    lat = np.array([position[0] for position in stations.values()])[:, None]
+    lon = np.array([position[1] for position in stations.values()])[:, None]
+    dy = latitude[iy][None, :] - lat
+    dx = (longitude[ix][None, :] - lon) * np.cos(np.deg2rad(lat))
+    nearest = np.argmin(dx ** 2 + dy ** 2, axis=1)
+    return iy[nearest], ix[nearest]
+
+
+def _read_stations(ds: xr.Dataset, iy: np.ndarray, ix: np.ndarray, names: list) -> xr.Dataset:
+    """Every variable of `ds` at the (iy, ix) pixels, in one vectorized indexed read."""
+    points = ds.isel(latitude=xr.DataArray(iy, dims="station"), longitude=xr.DataArray(ix, dims="station"))
+    points = compute(points.transpose("station", "time"))
+    return points.drop_vars(["latitude", "longitude"]).assign_coords(
+        station=names,
+        grid_latitude=("station", ds["latitude"].values[iy]),
+        grid_longitude=("station", ds["longitude"].values[ix]),
+        iy=("station", iy),
+        ix=("station", ix),
+    )
+
+
+def _covers(cache: xr.Dataset, variables: list, stations: dict) -> bool:
+    if any(name not in cache for name in variables):
+        return False
+    held = dict(zip(cache["station"].values, zip(cache["station_latitude"].values,
+                                                 cache["station_longitude"].values)))
+    return all(name in held and np.allclose(held[name], position) for name, position in stations.items())
+
+
+def _seasonal_means(series: xr.Dataset, variables: list) -> xr.Dataset:
+    """Day-of-year seasonal mean (doy, station) of each variable over the complete years."""
+    start, end = default_baseline(series["time"].values)
+    baseline = series.sel(time=slice(start, end))
+    doy = hobday_doy(baseline["time"].values)
+    means = {
+        f"{name}_mean_doy": (("doy", "station"),
+                             doy_mean_block(baseline[name].values.T, doy, WINDOW_DAYS, SMOOTH_DAYS))
+        for name in variables
+    }
+    ds = xr.Dataset(means, coords={"doy": np.arange(1, 367), "station": series["station"]})
+    ds.attrs.update(baseline_start=str(start.date()), baseline_end=str(end.date()))
+    return ds
+
+
+def update_station_cache(directory: str, dataset_id: str, variables: list, stations: dict) -> xr.Dataset:
+    """
+    Bring the station cache of `dataset_id` in `directory` up to date with
+    its long-record store for `variables` at `stations`, and return it
+    (loaded). Only the days after the cache's last day are read from the
+    store unless the cache lacks some of the stations or variables.
+    """
+    store = store_path(directory, dataset_id)
+    if not os.path.exists(store):
+        raise FileNotFoundError(f"❌ No long record for {dataset_id} at {store}")
+    path = station_cache_path(directory, dataset_id)
+
+    cache = None
+    if os.path.exists(path):
+        with xr.open_dataset(path) as saved:
+            cache = saved.load()
+        cached = [name for name in cache.data_vars if "doy" not in cache[name].dims]
+        if _covers(cache, variables, stations):
+            variables = cached
+        else:
+            held = dict(zip(cache["station"].values.tolist(), zip(cache["station_latitude"].values,
+                                                                  cache["station_longitude"].values)))
+            stations = {**held, **stations}
+            variables = sorted(set(variables) | set(cached))
+            cache = None
+
+    ds = open_product(store, variables)
+    if cache is None:
+        print(f"📍 Reading {len(stations)} stations from {store}...")
+        valid = np.isfinite(compute(ds[variables[0]].isel(time=-1)).values)
+        iy, ix = nearest_ocean(valid, ds["latitude"].values, ds["longitude"].values, stations)
+        series = _read_stations(ds, iy, ix, list(stations)).assign_coords(
+            station_latitude=("station", [position[0] for position in stations.values()]),
+            station_longitude=("station", [position[1] for position in stations.values()]),
+        )
+    else:
+        new = ds.sel(time=ds["time"] > cache["time"].values[-1])
+        if new.sizes["time"] == 0:
+            return cache
+        print(f"📍 Adding {new.sizes['time']} days to {path}...")
+        added = _read_stations(new, cache["iy"].values, cache["ix"].values, cache["station"].values.tolist())
+        added = added.assign_coords(station_latitude=cache["station_latitude"],
+                                    station_longitude=cache["station_longitude"])
+        series = xr.concat([cache[variables], added[variables]], dim="time")
+
+    cache = xr.merge([series[variables], _seasonal_means(series, variables)], combine_attrs="override")
+    tmp_path = path + ".tmp"
+    cache.to_netcdf(tmp_path)
+    os.replace(tmp_path, path)
+    return cache
+
+
+def extract(stations: dict, directories: dict, series: list = None, time=None,
+            refresh: bool = True) -> xr.Dataset:
+    """
+    (time, station) Dataset of `series` (SERIES names, default all) at
+    `stations` ({name: (latitude, longitude)}), restricted to `time` (see
+    loader.select_time). `directories` maps each dataset id to its
+    long-record directory. With `refresh`, station caches are first brought
+    up to date with the stores.
+    """
+    series = series or list(SERIES)
+    unknown = [name for name in series if name not in SERIES]
+    if unknown:
+        raise KeyError(f"❌ Unknown series: {', '.join(unknown)}. Known series: {', '.join(SERIES)}")
+
+    out = []
+    for dataset_id in dict.fromkeys(SERIES[name][0] for name in series):
+        wanted = [name for name in series if SERIES[name][0] == dataset_id]
+        variables = sorted({SERIES[name][1] for name in wanted})
+        if refresh:
+            cache = update_station_cache(directories[dataset_id], dataset_id, variables, stations)
+        else:
+            with xr.open_dataset(station_cache_path(directories[dataset_id], dataset_id)) as saved:
+                cache = saved.load()
+        cache = select_time(cache.sel(station=list(stations)), time)
+
+        ds = xr.Dataset()
+        for name in wanted:
+            _, variable, offset, anomaly, units = SERIES[name]
+            values = cache[variable]
+            if anomaly:
+                doy = xr.DataArray(hobday_doy(cache["time"].values), dims="time")
+                values = values - cache[f"{variable}_mean_doy"].sel(doy=doy).drop_vars("doy")
+            ds[name] = (values + offset).astype(np.float32).transpose("time", "station").reset_coords(drop=True)
+            ds[name].attrs["units"] = units
+        # Grid cell each station was read from, per dataset
+        prefix = "sst" if dataset_id == SST_DATASET else "ssh"
+        ds = ds.assign_coords({
+            f"{prefix}_latitude": ("station", cache["grid_latitude"].values),
+            f"{prefix}_longitude": ("station", cache["grid_longitude"].values),
+        })
+        out.append(ds)
+
+    ds = xr.merge(out, join="outer")
+    return ds.assign_coords(
+        latitude=("station", [stations[name][0] for name in ds["station"].values]),
+        longitude=("station", [stations[name][1] for name in ds["station"].values]),
+    )
+
+
+def to_frame(ds: xr.Dataset) -> pd.DataFrame:
+    """Long table (time, station, one column per series) for CSV output."""
+    names = [name for name in ds.data_vars]
+    return ds[names].to_dataframe().reset_index()[["time", "station"] + names]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The product modules are imported from public/products, as the product scripts do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
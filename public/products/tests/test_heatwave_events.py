@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from heatwave_events import STATE, current_events, update_events
+
+DAYS = 90
+
+
+def synthetic_record():
+    """SST (time, latitude, longitude) with runs above a flat threshold of 20 °C, a gap and missing days."""
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2023-12-01", periods=DAYS, freq="D")
+    latitude, longitude = np.array([-34.0, -33.0, -32.0]), np.array([18.0, 19.0, 20.0, 21.0])
+    sst = 19 + rng.random((DAYS, latitude.size, longitude.size)) * 0.5
+    sst[10:18, 0, :] += 2  # an 8-day event
+    sst[30:36, 1, :] += 3  # two events 2 days apart, joined
+    sst[38:45, 1, :] += 4
+    sst[60:63, 2, :] += 2  # too short to be an event
+    sst[70:90, 2, 1] += 1.5  # ongoing on the last day
+    sst[50, :, 3] = np.nan  # a missing day
+    sst = xr.DataArray(sst.astype(np.float32), dims=("time", "latitude", "longitude"),
+                       coords={"time": times, "latitude": latitude, "longitude": longitude})
+    doy = np.arange(1, 367)
+    shape = (doy.size, latitude.size, longitude.size)
+    coords = {"doy": doy, "latitude": latitude, "longitude": longitude}
+    threshold = xr.DataArray(np.full(shape, 20.0, dtype=np.float32), dims=("doy", "latitude", "longitude"),
+                             coords=coords)
+    seas = xr.DataArray(np.full(shape, 19.0, dtype=np.float32), dims=("doy", "latitude", "longitude"),
+                        coords=coords)
+    return sst, threshold, seas
+
+
+def test_daily_updates_match_rebuild(tmp_path):
+    sst, threshold, seas = synthetic_record()
+
+    for day in range(1, DAYS + 1):
+        daily = update_events(str(tmp_path / "daily.nc"), sst.isel(time=slice(0, day)), threshold, seas)
+    rebuilt = update_events(str(tmp_path / "rebuilt.nc"), sst, threshold, seas, rebuild=True)
+
+    assert daily.attrs["last_time"] == rebuilt.attrs["last_time"]
+    for name in STATE:
+        np.testing.assert_array_equal(daily[name].values, rebuilt[name].values, err_msg=name)
+
+
+def test_events_detected(tmp_path):
+    sst, threshold, seas = synthetic_record()
+    state = update_events(str(tmp_path / "state.nc"), sst, threshold, seas, rebuild=True)
+
+    # Row 1: 6 + 2 gap + 7 days joined into one event; row 2: only the short run
+    assert (state["ev_duration"].values[1, :] == 15).all()
+    assert state["ev_duration"].values[2, 0] == 0
+    events = current_events(state)
+    assert events["duration"].values[2, 1] == 20
+    assert np.isnan(events["duration"].values[0]).all()
+
+
+def test_changed_climatology_rebuilds_state(tmp_path):
+    sst, threshold, seas = synthetic_record()
+    threshold.attrs["fingerprint"] = seas.attrs["fingerprint"] = "old"
+    update_events(str(tmp_path / "state.nc"), sst.isel(time=slice(0, 60)), threshold, seas)
+
+    # New baseline: a lower threshold, so the earlier days hold more events
+    new_threshold = (threshold - 0.3).assign_attrs(fingerprint="new")
+    updated = update_events(str(tmp_path / "state.nc"), sst, new_threshold, seas)
+    rebuilt = update_events(str(tmp_path / "rebuilt.nc"), sst, new_threshold, seas, rebuild=True)
+
+    assert updated.attrs["threshold_fingerprint"] == "new"
+    for name in STATE:
+        np.testing.assert_array_equal(updated[name].values, rebuilt[name].values, err_msg=name)
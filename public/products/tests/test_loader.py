@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from loader import open_product
+
+SCALE, OFFSET, FILL = 0.01, 273.15, -32768
+
+
+@pytest.fixture
+def packed_file(tmp_path):
+    """Small int16-packed SST file with descending latitude and one missing pixel, as CMEMS writes them."""
+    times = pd.date_range("2024-01-01", periods=5, freq="D")
+    latitude = np.arange(-20.0, -41.0, -1.0)  # descending
+    longitude = np.arange(10.0, 41.0, 1.0)
+    sst = 290 + 0.1 * np.arange(times.size)[:, None, None] + np.add.outer(latitude, longitude)[None] / 100
+    sst[2, 5, 5] = np.nan
+    ds = xr.Dataset(
+        {"analysed_sst": (("time", "latitude", "longitude"), sst),
+         "mask": (("time", "latitude", "longitude"), np.ones(sst.shape, dtype=np.int8))},
+        coords={"time": times, "latitude": latitude, "longitude": longitude},
+    )
+    path = tmp_path / "sst.nc"
+    ds.to_netcdf(path, encoding={"analysed_sst": {
+        "dtype": "int16", "scale_factor": SCALE, "add_offset": OFFSET, "_FillValue": FILL}})
+    return path, ds
+
+
+def test_decodes_packed_values_once(packed_file):
+    path, expected = packed_file
+    with xr.open_dataset(path, decode_cf=False) as raw:
+        assert raw["analysed_sst"].dtype == np.int16
+
+    ds = open_product(path, ["analysed_sst"])
+    values = ds["analysed_sst"].values
+    assert ds["analysed_sst"].dtype == np.float32
+    assert np.isnan(values[2, 5, 5])
+    assert np.isnan(values).sum() == 1
+    np.testing.assert_allclose(values, expected["analysed_sst"].values, atol=SCALE)
+
+
+def test_selects_bbox_and_time_with_descending_latitude(packed_file):
+    path, expected = packed_file
+    bbox = {"minimum_longitude": 15, "maximum_longitude": 20, "minimum_latitude": -30, "maximum_latitude": -25}
+
+    ds = open_product(path, ["analysed_sst"], time=("2024-01-02", "2024-01-04"), bbox=bbox)
+    assert ds.sizes == {"time": 3, "latitude": 6, "longitude": 6}
+    assert ds["latitude"].values[0] == -25 and ds["latitude"].values[-1] == -30
+    assert str(ds["time"].values[0])[:10] == "2024-01-02"
+    np.testing.assert_allclose(
+        ds["analysed_sst"].values,
+        expected["analysed_sst"].sel(time=slice("2024-01-02", "2024-01-04"), latitude=slice(-25, -30),
+                                     longitude=slice(15, 20)).values,
+        atol=SCALE,
+    )
+
+    latest = open_product(path, ["analysed_sst"], time="latest")
+    assert latest.sizes["time"] == 1 and str(latest["time"].values[0])[:10] == "2024-01-05"
+
+
+def test_stays_lazy_and_keeps_integer_variables(packed_file):
+    path, _ = packed_file
+    ds = open_product(path, ["analysed_sst", "mask"])
+    assert ds["analysed_sst"].chunks is not None
+    assert ds["mask"].dtype == np.int8
+
+
+def test_missing_variable_raises(packed_file):
+    path, _ = packed_file
+    with pytest.raises(KeyError, match="sea_ice_fraction"):
+        open_product(path, ["analysed_sst", "sea_ice_fraction"])
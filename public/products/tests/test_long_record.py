@@ -0,0 +1,166 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from cmems import LocalFakeProvider
+from long_record import append_to_store, check_daily, fetch_partitions, store_path, update_long_record
+
+DATASET = "TEST-SST"
+VARIABLES = ["analysed_sst"]
+FIRST, LAST = datetime(2020, 11, 15), datetime(2022, 2, 10)
+
+
+def synthetic_source(start=FIRST, end=LAST) -> xr.Dataset:
+    """Daily SST on a small grid inside BBOX, descending latitude as CMEMS serves it."""
+    times = pd.date_range(start, end, freq="D")
+    latitude, longitude = np.arange(-21.0, -26.0, -1.0), np.arange(11.0, 17.0)
+    sst = 290 + np.arange(times.size)[:, None, None] / 100 + np.add.outer(latitude, longitude)[None] / 10
+    return xr.Dataset({"analysed_sst": (("time", "latitude", "longitude"), sst.astype(np.float32))},
+                      coords={"time": times, "latitude": latitude, "longitude": longitude})
+
+
+class FlakyProvider(LocalFakeProvider):
+    """LocalFakeProvider whose requests starting on a day in `failures` fail that many times."""
+
+    def __init__(self, source, failures: dict):
+        super().__init__(source)
+        self.failures = Counter(failures)
+
+    def subset(self, dataset_id, variables, start, end, output_directory, output_filename, bbox=None):
+        with self._lock:
+            if self.failures[start] > 0:
+                self.calls.append((dataset_id, start, end))
+                self.failures[start] -= 1
+                raise ConnectionError(f"flaky request from {start:%Y-%m-%d}")
+        return super().subset(dataset_id, variables, start, end, output_directory, output_filename,
+                              **({"bbox": bbox} if bbox else {}))
+
+
+def starts(provider) -> Counter:
+    return Counter(start for _, start, _ in provider.calls)
+
+
+def test_only_failed_partitions_are_fetched_again(tmp_path):
+    provider = FlakyProvider(synthetic_source(), {datetime(2021, 1, 1): 2})
+
+    paths = fetch_partitions(str(tmp_path), DATASET, VARIABLES, FIRST, LAST, provider, workers=3)
+
+    assert all(paths)
+    assert starts(provider) == {FIRST: 1, datetime(2021, 1, 1): 3, datetime(2022, 1, 1): 1}
+
+
+def test_completed_partitions_are_reused(tmp_path):
+    source = synthetic_source()
+    failing = FlakyProvider(source, {datetime(2021, 1, 1): 99})
+    paths = fetch_partitions(str(tmp_path), DATASET, VARIABLES, FIRST, LAST, failing, retries=2)
+    assert paths[0] and paths[1] is None
+
+    provider = LocalFakeProvider(source)
+    paths = fetch_partitions(str(tmp_path), DATASET, VARIABLES, FIRST, LAST, provider)
+
+    # The final partition is always fetched again, its end date may have moved
+    assert all(paths)
+    assert starts(provider) == {datetime(2021, 1, 1): 1, datetime(2022, 1, 1): 1}
+
+
+@pytest.mark.parametrize("freq", ["YS", "MS"])
+def test_merged_partitions_match_a_single_fetch(tmp_path, freq):
+    source = synthetic_source()
+    (tmp_path / "partitioned").mkdir()
+    (tmp_path / "single").mkdir()
+    # Middle partitions only: a failing final one steps its end date back
+    flaky = FlakyProvider(source, {datetime(2021, 1, 1): 1, datetime(2021, 3, 1): 1})
+    written = update_long_record(str(tmp_path / "partitioned"), DATASET, VARIABLES, FIRST, flaky,
+                                 end_date=LAST, partition_freq=freq, workers=4)
+    update_long_record(str(tmp_path / "single"), DATASET, VARIABLES, FIRST, LocalFakeProvider(source),
+                       end_date=LAST)
+
+    partitioned = xr.open_zarr(store_path(str(tmp_path / "partitioned"), DATASET))
+    single = xr.open_zarr(store_path(str(tmp_path / "single"), DATASET))
+    times = pd.DatetimeIndex(partitioned["time"].values)
+    assert written == source.sizes["time"]
+    assert times.is_monotonic_increasing and times.is_unique
+    xr.testing.assert_equal(partitioned.load(), single.load())
+    xr.testing.assert_equal(partitioned["analysed_sst"].load(), source["analysed_sst"])
+
+
+def store_times(directory) -> pd.DatetimeIndex:
+    with xr.open_zarr(store_path(str(directory), DATASET)) as ds:
+        return pd.DatetimeIndex(ds["time"].values)
+
+
+def test_update_appends_only_the_new_days(tmp_path):
+    source = synthetic_source(end=datetime(2021, 1, 20))
+    update_long_record(str(tmp_path), DATASET, VARIABLES, FIRST, LocalFakeProvider(source),
+                       end_date=datetime(2021, 1, 10))
+    before = store_times(tmp_path)
+
+    provider = LocalFakeProvider(source)
+    written = update_long_record(str(tmp_path), DATASET, VARIABLES, FIRST, provider,
+                                 end_date=datetime(2021, 1, 20))
+
+    assert written == 10
+    assert provider.calls == [(DATASET, datetime(2021, 1, 11), datetime(2021, 1, 20))]
+    after = store_times(tmp_path)
+    assert after[:len(before)].equals(before)
+    assert after[len(before):].equals(pd.date_range("2021-01-11", "2021-01-20", freq="D"))
+    with xr.open_zarr(store_path(str(tmp_path), DATASET)) as ds:
+        xr.testing.assert_equal(ds["analysed_sst"].load(), source["analysed_sst"])
+
+
+def test_update_without_new_days_is_a_no_op(tmp_path):
+    source = synthetic_source(end=datetime(2021, 1, 10))
+    update_long_record(str(tmp_path), DATASET, VARIABLES, FIRST, LocalFakeProvider(source),
+                       end_date=datetime(2021, 1, 10))
+    before = store_times(tmp_path)
+
+    provider = LocalFakeProvider(source)
+    assert update_long_record(str(tmp_path), DATASET, VARIABLES, FIRST, provider,
+                              end_date=datetime(2021, 1, 10)) == 0
+    assert provider.calls == []
+    # The provider has nothing newer yet: the end date steps back to the store's last day
+    assert update_long_record(str(tmp_path), DATASET, VARIABLES, FIRST, provider,
+                              end_date=datetime(2021, 1, 12), max_lookback_days=3) == 0
+    assert store_times(tmp_path).equals(before)
+
+
+@pytest.mark.parametrize("times", [
+    pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-04"]),  # a missing day
+    pd.DatetimeIndex(["2021-01-01T00", "2021-01-01T12", "2021-01-02T00"]),  # sub-daily
+    pd.date_range("2021-01-01", periods=3, freq="MS"),  # monthly means
+])
+def test_check_daily_rejects_gaps_and_other_steps(tmp_path, times):
+    ds = synthetic_source(FIRST, FIRST + timedelta(days=2)).assign_coords(time=times)
+    with pytest.raises(ValueError, match="not a gap-free daily record"):
+        check_daily(ds, "test data")
+    with pytest.raises(ValueError):
+        append_to_store(ds, store_path(str(tmp_path), DATASET))
+    assert not (tmp_path / f"{DATASET}.zarr").exists()
+
+
+def test_failed_append_rolls_back(tmp_path, monkeypatch):
+    store = store_path(str(tmp_path), DATASET)
+    source = synthetic_source(end=datetime(2021, 1, 20))
+    append_to_store(source.sel(time=slice(None, "2021-01-10")), store)
+    before = store_times(tmp_path)
+
+    to_zarr = xr.Dataset.to_zarr
+
+    def write_then_fail(self, *args, **kwargs):
+        to_zarr(self, *args, **kwargs)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(xr.Dataset, "to_zarr", write_then_fail)
+    with pytest.raises(OSError, match="disk full"):
+        append_to_store(source, store)
+    monkeypatch.undo()
+
+    assert store_times(tmp_path).equals(before)
+    with xr.open_zarr(store) as ds:
+        assert ds["analysed_sst"].shape[0] == len(before)
+    # The next run appends the same days again
+    assert append_to_store(source, store) == 10
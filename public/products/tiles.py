@@ -0,0 +1,236 @@
+"""
+XYZ tile pyramids of the satellite products for the website.
+
+export_tiles() renders each product grid into a Web Mercator tile pyramid.
+The layout is the standard "slippy map" one, so Leaflet or OpenLayers can
+load <TILES_DIR>/<product>/{z}/{x}/{y}.png and fetch only the tiles in
+view at the zoom in use:
+
+    export_tiles({"sst": (lon, lat, sst), "sst_anomaly": (lon, lat, anomaly)})
+
+Every product has a fixed colormap and value range (PRODUCTS). Tiles of
+different days and zoom levels therefore match, and one legend serves them
+all. The range is recorded with the tile hashes in <product>/tiles.json.
+
+Tiles are sampled nearest-neighbour from the regular lat/lon grid and
+rendered on a process pool (SOMISANA_WORKERS). A tile is only rendered
+again when the grid cells under it or the product's style changed since
+the last run. Tiles without data are not written.
+
+Tile export is off unless SOMISANA_TILES=1: the site is published from git
+and no page loads tiles yet, so the daily runs skip the rendering. The
+default TILES_DIR (public/products/tiles) is git-ignored, as a pyramid is
+thousands of small files that change every day and update_repo.sh commits
+everything it finds. Once a host serves them, point SOMISANA_TILES_DIR at
+its document root and set SOMISANA_TILES=1.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chunked import FORK, WORKERS
+
+TILES_ENABLED = os.getenv("SOMISANA_TILES", "0") == "1"
+TILES_DIR = os.getenv("SOMISANA_TILES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiles"))
+TILE_FORMAT = os.getenv("SOMISANA_TILE_FORMAT", "png")  # png or webp
+TILE_ZOOMS = os.getenv("SOMISANA_TILE_ZOOMS", "3-7")  # first-last zoom level
+TILE_SIZE = 256
+TILES_VERSION = 1  # bump when the rendering changes to re-render every tile
+
+# product: (colormap, vmin, vmax, units)
+PRODUCTS = {
+    "sst": ("jet", 10.0, 30.0, "°C"),
+    "sst_anomaly": ("RdBu_r", -4.0, 4.0, "°C"),
+    "mhw_intensity": ("YlOrRd", 0.0, 5.0, "°C"),
+    "adt": ("jet", 0.0, 1.5, "m"),
+    "sla": ("RdBu", -0.5, 0.5, "m"),
+}
+
+
+def parse_zooms(zooms: str) -> list:
+    """Zoom levels from "first-last" or a single level."""
+    first, _, last = zooms.partition("-")
+    return list(range(int(first), int(last or first) + 1))
+
+
+def tile_range(extent: tuple, z: int) -> tuple:
+    """(x tiles, y tiles) ranges of zoom `z` that cover `extent` (west, east, south, north)."""
+    west, east, south, north = extent
+    n = 2 ** z
+
+    def column(lon):
+        return min(n - 1, max(0, int((lon + 180) / 360 * n)))
+
+    def row(lat):
+        lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+        return min(n - 1, max(0, int((1 - np.arcsinh(np.tan(lat)) / np.pi) / 2 * n)))
+
+    return range(column(west), column(east) + 1), range(row(north), row(south) + 1)
+
+
+def pixel_centres(z: int, x: int, y: int) -> tuple:
+    """Longitudes of the tile's pixel columns and latitudes of its pixel rows (north first)."""
+    n = 2 ** z * TILE_SIZE
+    offsets = np.arange(TILE_SIZE) + 0.5
+    lon = (x * TILE_SIZE + offsets) / n * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y * TILE_SIZE + offsets) / n))))
+    return lon, lat
+
+
+def _nearest(values: np.ndarray, axis: np.ndarray) -> np.ndarray:
+    # Nearest index on a regular axis (ascending or descending), -1 outside it
+    step = axis[1] - axis[0]
+    index = np.rint((values - axis[0]) / step).astype(int)
+    return np.where((index >= 0) & (index < axis.size), index, -1)
+
+
+def tile_indices(lon: np.ndarray, lat: np.ndarray, z: int, x: int, y: int) -> tuple:
+    """Grid (row, column) indices sampled by each tile pixel row and column, -1 off the grid."""
+    tile_lon, tile_lat = pixel_centres(z, x, y)
+    return _nearest(tile_lat, lat), _nearest(tile_lon, lon)
+
+
+def tile_key(product: str, field: np.ndarray, iy: np.ndarray, ix: np.ndarray) -> str:
+    """
+    Hash of the product style and the grid cells a tile samples; "" when
+    the tile samples no data.
+    """
+    rows, columns = iy[iy >= 0], ix[ix >= 0]
+    if rows.size == 0 or columns.size == 0:
+        return ""
+    cells = field[rows.min():rows.max() + 1, columns.min():columns.max() + 1]
+    if not np.isfinite(cells).any():
+        return ""
+    digest = hashlib.sha256(json.dumps([TILES_VERSION, PRODUCTS[product]]).encode())
+    digest.update(str(cells.shape).encode())
+    digest.update(np.ascontiguousarray(cells).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def render_tile(product: str, field: np.ndarray, iy: np.ndarray, ix: np.ndarray) -> np.ndarray:
+    """RGBA (TILE_SIZE, TILE_SIZE, 4) uint8 tile; missing data is transparent."""
+    import matplotlib
+
+    cmap, vmin, vmax, _ = PRODUCTS[product]
+    values = np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype=np.float32)
+    rows, columns = np.ix_(iy >= 0, ix >= 0)
+    values[rows, columns] = field[np.ix_(iy[iy >= 0], ix[ix >= 0])]
+    normalised = np.ma.masked_invalid((values - vmin) / (vmax - vmin))
+    return matplotlib.colormaps[cmap](normalised, bytes=True)
+
+
+def tile_path(directory: str, product: str, z: int, x: int, y: int, fmt: str = TILE_FORMAT) -> str:
+    return os.path.join(directory, product, str(z), str(x), f"{y}.{fmt}")
+
+
+_GRIDS = {}
+
+
+def _init_worker(grids: dict):
+    # Each worker gets the product grids once, not with every tile
+    _GRIDS.update(grids)
+
+
+def _write_tile(job: tuple):
+    product, z, x, y, path, fmt = job
+    from PIL import Image
+
+    lon, lat, field = _GRIDS[product]
+    iy, ix = tile_indices(lon, lat, z, x, y)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    options = {"lossless": True} if fmt == "webp" else {"optimize": True}
+    Image.fromarray(render_tile(product, field, iy, ix), "RGBA").save(tmp_path, format=fmt.upper(), **options)
+    os.replace(tmp_path, path)
+
+
+def _load_manifest(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def export_tiles(fields: dict, directory: str = TILES_DIR, zooms: list = None, fmt: str = TILE_FORMAT,
+                 workers: int = WORKERS) -> dict:
+    """
+    Render `fields` ({product: (lon, lat, field)}, products from PRODUCTS,
+    regular 1-D lon and lat) into tile pyramids under `directory` at
+    `zooms` (default SOMISANA_TILE_ZOOMS). Only tiles whose data or style
+    changed since the last run are rendered. Returns {product: (rendered,
+    unchanged, empty)} tile counts, or {} when tile export is disabled
+    (SOMISANA_TILES).
+    """
+    if not TILES_ENABLED:
+        print("⏭️ Map tiles skipped (set SOMISANA_TILES=1 to export them)")
+        return {}
+    zooms = zooms or parse_zooms(TILE_ZOOMS)
+    unknown = [product for product in fields if product not in PRODUCTS]
+    if unknown:
+        raise KeyError(f"❌ Unknown tile products: {', '.join(unknown)}. Known products: {', '.join(PRODUCTS)}")
+
+    grids, jobs, manifests, counts = {}, [], {}, {}
+    for product, (lon, lat, field) in fields.items():
+        lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+        field = np.asarray(field, dtype=np.float32)
+        grids[product] = (lon, lat, field)
+
+        manifest_path = os.path.join(directory, product, "tiles.json")
+        previous = _load_manifest(manifest_path).get("tiles", {})
+        extent = (lon.min(), lon.max(), lat.min(), lat.max())
+        tiles, rendered, unchanged, empty = {}, 0, 0, 0
+        for z in zooms:
+            columns, rows = tile_range(extent, z)
+            for x in columns:
+                for y in rows:
+                    path = tile_path(directory, product, z, x, y, fmt)
+                    key = tile_key(product, field, *tile_indices(lon, lat, z, x, y))
+                    name = f"{z}/{x}/{y}"
+                    if not key:
+                        empty += 1
+                        if os.path.exists(path):
+                            os.remove(path)
+                        continue
+                    tiles[name] = key
+                    if previous.get(name) == key and os.path.exists(path):
+                        unchanged += 1
+                    else:
+                        rendered += 1
+                        jobs.append((product, z, x, y, path, fmt))
+
+        cmap, vmin, vmax, units = PRODUCTS[product]
+        manifests[manifest_path] = {
+            "product": product, "colormap": cmap, "vmin": vmin, "vmax": vmax, "units": units,
+            "format": fmt, "tile_size": TILE_SIZE, "zooms": [min(zooms), max(zooms)],
+            "bounds": [float(value) for value in extent], "tiles": tiles,
+        }
+        counts[product] = (rendered, unchanged, empty)
+
+    start = time.perf_counter()
+    workers = max(1, min(workers, len(jobs)))
+    if workers == 1:
+        _init_worker(grids)
+        for job in jobs:
+            _write_tile(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=FORK, initializer=_init_worker,
+                                 initargs=(grids,)) as pool:
+            list(pool.map(_write_tile, jobs, chunksize=16))
+    elapsed = time.perf_counter() - start
+
+    # Manifests last, so an interrupted run renders its missing tiles next time
+    for manifest_path, manifest in manifests.items():
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, manifest_path)
+
+    for product, (rendered, unchanged, empty) in counts.items():
+        print(f"🧱 {product}: {rendered} tiles rendered, {unchanged} unchanged, {empty} empty")
+    print(f"✅ Rendered {len(jobs)} tiles in {elapsed:.2f} s on {workers} workers to {directory}")
+    return counts
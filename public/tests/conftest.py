@@ -0,0 +1,52 @@
+import os
+import sys
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# download_gifs.py is imported from public/, as run_downloads.sh runs it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+class ForecastHandler(SimpleHTTPRequestHandler):
+    """Static files with a fixed delay per request; every (path, status) is recorded."""
+    protocol_version = "HTTP/1.1"  # keep-alive, as the forecast server
+
+    def __init__(self, *args, server_state, **kwargs):
+        self.server_state = server_state
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        time.sleep(self.server_state["latency"])
+        super().do_GET()
+
+    def log_request(self, code="-", size="-"):
+        with self.server_state["lock"]:
+            self.server_state["requests"].append((self.path, int(code)))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def forecast_server(tmp_path):
+    """
+    Local stand-in for the forecast file server, serving tmp_path/"server".
+    Yields a dict with the "url", the served "root", the "latency" per
+    request (seconds, adjustable) and the "requests" seen so far.
+    """
+    root = tmp_path / "server"
+    root.mkdir()
+    state = {"latency": 0.0, "requests": [], "lock": threading.Lock(), "root": root}
+    handler = partial(ForecastHandler, directory=str(root), server_state=state)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
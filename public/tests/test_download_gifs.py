@@ -0,0 +1,300 @@
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import download_gifs
+
+LATENCY = 0.05  # seconds the stand-in server waits before every response
+
+
+def publish_cycle(root, region: str, model: str, date_path: str, files=download_gifs.GIF_FILES):
+    """Write `files` of one region/model cycle under the served root."""
+    directory = root / region / "v1.0" / "forecasts" / date_path / model
+    directory.mkdir(parents=True, exist_ok=True)
+    for fname in files:
+        (directory / fname).write_bytes(f"{region}/{date_path}/{model}/{fname}\n".encode() * 64)
+
+
+@pytest.fixture
+def mirror(forecast_server, tmp_path, monkeypatch):
+    """
+    mirror(name) points download_gifs at forecast_server with fresh local
+    state (manifest, cycle index, log, session) under tmp_path/name.
+    """
+    for region in download_gifs.BASE_URLS:
+        monkeypatch.setitem(download_gifs.BASE_URLS, region, f"{forecast_server['url']}/{region}/v1.0/forecasts")
+    monkeypatch.setattr(download_gifs, "ARCHIVE", False)
+
+    def point_at(name: str):
+        directory = tmp_path / name
+        directory.mkdir()
+        for region in download_gifs.BASE_URLS:
+            monkeypatch.setitem(download_gifs.LOCAL_DIRS, region, str(directory / region / "latest_forecasts"))
+        monkeypatch.setattr(download_gifs, "LOG_FILE", str(directory / "download_log.txt"))
+        monkeypatch.setattr(download_gifs, "MANIFEST_FILE", str(directory / "download_manifest.json"))
+        monkeypatch.setattr(download_gifs, "CYCLE_INDEX_FILE", str(directory / "cycle_index.json"))
+        monkeypatch.setattr(download_gifs, "_manifest", None)
+        monkeypatch.setattr(download_gifs, "_session", None)
+        monkeypatch.setattr(download_gifs, "_host_slots", {})
+        monkeypatch.setattr(download_gifs, "RUN_STATS", download_gifs.Counter())
+        return directory
+
+    return point_at
+
+
+def run(workers: int, monkeypatch) -> float:
+    """main() with `workers` concurrent requests; returns the wall time."""
+    monkeypatch.setattr(download_gifs, "MAX_WORKERS", workers)
+    monkeypatch.setattr(download_gifs, "PER_HOST_LIMIT", workers)
+    start = time.perf_counter()
+    download_gifs.main()
+    return time.perf_counter() - start
+
+
+def attempts(directory) -> list:
+    """The per-region/model lines of download_log.txt, without the date."""
+    lines = (directory / "download_log.txt").read_text().splitlines()
+    return [line.split(" - ", 1)[1] for line in lines if "summary" not in line]
+
+
+def test_concurrent_fetch_is_faster_with_the_same_result(forecast_server, mirror, monkeypatch):
+    today = download_gifs.get_date_path(0)
+    yesterday = download_gifs.get_date_path(1)
+    for region in download_gifs.BASE_URLS:
+        for model in download_gifs.MODELS[:-1]:
+            publish_cycle(forecast_server["root"], region, model, today)
+        # The last model is a day behind and misses one file
+        publish_cycle(forecast_server["root"], region, download_gifs.MODELS[-1], yesterday,
+                      download_gifs.GIF_FILES[1:])
+    forecast_server["latency"] = LATENCY
+
+    serial_dir = mirror("serial")
+    serial = run(1, monkeypatch)
+    concurrent_dir = mirror("concurrent")
+    concurrent = run(8, monkeypatch)
+
+    print(f"serial {serial:.2f} s, 8 workers {concurrent:.2f} s ({serial / concurrent:.1f}x)")
+    assert serial / concurrent > 3
+
+    # Same files, same per-region/model log lines in the same order
+    assert attempts(concurrent_dir) == attempts(serial_dir)
+    assert all(line.endswith("Success") for line in attempts(serial_dir))
+    for region in download_gifs.BASE_URLS:
+        served = forecast_server["root"] / region / "v1.0" / "forecasts"
+        for model in download_gifs.MODELS:
+            date_path = yesterday if model == download_gifs.MODELS[-1] else today
+            for fname in download_gifs.GIF_FILES:
+                source = served / date_path / model / fname
+                for directory in (serial_dir, concurrent_dir):
+                    local = directory / region / "latest_forecasts" / model / fname
+                    assert local.exists() == source.exists()
+                    if source.exists():
+                        assert local.read_bytes() == source.read_bytes()
+
+
+def requested(forecast_server, *parts) -> list:
+    """Paths requested so far that contain every one of `parts`."""
+    return [path for path, _ in forecast_server["requests"] if all(part in path for part in parts)]
+
+
+def test_discover_cycles_finds_the_latest_cycle_of_every_model(forecast_server, mirror):
+    mirror("mirror")
+    west, southeast = download_gifs.BASE_URLS
+    fresh, late, stale, absent = download_gifs.MODELS
+    days = [download_gifs.get_date_path(days_back) for days_back in range(download_gifs.LOOKBACK_DAYS)]
+    root = forecast_server["root"]
+    publish_cycle(root, west, fresh, days[0])
+    publish_cycle(root, west, fresh, days[1])
+    publish_cycle(root, west, late, days[1])
+    publish_cycle(root, west, stale, days[3])
+    for model in (fresh, late, stale):
+        publish_cycle(root, southeast, model, days[0])
+    publish_cycle(root, southeast, absent, days[0], download_gifs.GIF_FILES[-1:])  # any one file will do
+
+    cycles = download_gifs.discover_cycles(workers=4)
+
+    assert cycles == {
+        (west, fresh): days[0], (west, late): days[1], (west, stale): days[3], (west, absent): None,
+        (southeast, fresh): days[0], (southeast, late): days[0], (southeast, stale): days[0],
+        (southeast, absent): days[0],
+    }
+    # Newest first: nothing older than the cycle found is probed
+    assert not requested(forecast_server, west, fresh, days[1])
+    assert not requested(forecast_server, west, stale, days[4])
+    assert len(requested(forecast_server, west, absent)) == download_gifs.LOOKBACK_DAYS * len(download_gifs.GIF_FILES)
+
+    index = download_gifs.load_cycle_index()
+    assert index["cycles"] == {f"{region}/{model}": date_path
+                               for (region, model), date_path in cycles.items() if date_path}
+
+
+def test_discover_cycles_caches_misses_while_a_cycle_is_late(forecast_server, mirror, monkeypatch):
+    mirror("mirror")
+    west, _ = download_gifs.BASE_URLS
+    late = download_gifs.MODELS[0]
+    today, yesterday = download_gifs.get_date_path(0), download_gifs.get_date_path(1)
+    root = forecast_server["root"]
+    for region in download_gifs.BASE_URLS:
+        for model in download_gifs.MODELS:
+            publish_cycle(root, region, model, yesterday if (region, model) == (west, late) else today)
+
+    assert download_gifs.discover_cycles(workers=4)[(west, late)] == yesterday
+    assert len(requested(forecast_server, west, today, late)) == len(download_gifs.GIF_FILES)
+
+    # The next run starts from the stored cycles and trusts the cached misses
+    forecast_server["requests"].clear()
+    cycles = download_gifs.discover_cycles(workers=4)
+    assert cycles[(west, late)] == yesterday
+    assert not requested(forecast_server, west, today, late)
+    older = [download_gifs.get_date_path(days_back) for days_back in range(2, download_gifs.LOOKBACK_DAYS)]
+    assert not any(requested(forecast_server, date_path) for date_path in older)
+
+    # The late cycle shows up: found once its misses expire
+    publish_cycle(root, west, late, today)
+    assert download_gifs.discover_cycles(workers=4)[(west, late)] == yesterday
+    monkeypatch.setattr(download_gifs, "NEGATIVE_TTL", 0)
+    assert download_gifs.discover_cycles(workers=4)[(west, late)] == today
+
+
+def test_discover_cycles_probes_a_missing_date_directory_once(forecast_server, mirror):
+    directory = mirror("mirror")
+    west, southeast = download_gifs.BASE_URLS
+    today, yesterday, before = (download_gifs.get_date_path(days_back) for days_back in range(3))
+    root = forecast_server["root"]
+    for model in download_gifs.MODELS:
+        publish_cycle(root, west, model, before)
+        publish_cycle(root, west, model, yesterday)  # today's cycle not started yet
+        publish_cycle(root, southeast, model, today)
+    (directory / "cycle_index.json").write_text(download_gifs.json.dumps(
+        {"cycles": {f"{region}/{model}": before for region in download_gifs.BASE_URLS
+                    for model in download_gifs.MODELS}}))
+
+    cycles = download_gifs.discover_cycles(workers=4)
+
+    assert all(cycles[(west, model)] == yesterday for model in download_gifs.MODELS)
+    assert all(cycles[(southeast, model)] == today for model in download_gifs.MODELS)
+    # One request for the missing directory instead of one per model and file
+    assert requested(forecast_server, west, today) == [f"/{west}/v1.0/forecasts/{today}/"]
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """
+    One file at every path, with Range / If-Range support. The server state
+    sets its "body", "last_modified" (None for no validator), "chunked"
+    (no Content-Length) and "truncate" (responses still to be cut off
+    halfway). Requests are recorded as (Range header, status).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        state = self.server.state
+        body, last_modified = state["body"], state["last_modified"]
+        byte_range = self.headers.get("Range")
+        status, start = 200, 0
+        if byte_range and self.headers.get("If-Range", last_modified) == last_modified:
+            start = int(byte_range.removeprefix("bytes=").split("-")[0])
+            status = 416 if start >= len(body) else 206
+        state["requests"].append((byte_range, status))
+
+        self.send_response(status)
+        if last_modified:
+            self.send_header("Last-Modified", last_modified)
+        if status == 416:
+            self.send_header("Content-Range", f"bytes */{len(body)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        body = body[start:]
+        if state["chunked"]:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        cut = state["truncate"] > 0
+        state["truncate"] -= cut
+        payload = body[:len(body) // 2] if cut else body
+        if state["chunked"]:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            if not cut:
+                self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.wfile.write(payload)
+        if cut:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    server.daemon_threads = True
+    server.state = {"body": bytes(range(256)) * 400, "last_modified": formatdate(1.7e9, usegmt=True),
+                    "chunked": False, "truncate": 0, "requests": []}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.state["url"] = f"http://127.0.0.1:{server.server_address[1]}/croco_avg_temp_surf.mp4"
+    yield server.state
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_resumes_an_interrupted_transfer(file_server, tmp_path, monkeypatch):
+    # Whole chunks up to the cut are written before the read fails
+    monkeypatch.setattr(download_gifs, "CHUNK_SIZE", 1024)
+    file_server["truncate"] = 1
+    local = tmp_path / "croco_avg_temp_surf.mp4"
+
+    meta = download_gifs.download_file(file_server["url"], str(local))
+
+    half = len(file_server["body"]) // 2
+    assert file_server["requests"] == [(None, 200), (f"bytes={half}-", 206)]
+    assert meta["size"] == len(file_server["body"])
+    assert local.read_bytes() == file_server["body"]
+    assert not (tmp_path / "croco_avg_temp_surf.mp4.part").exists()
+
+
+def test_download_restarts_when_the_partial_file_cannot_be_resumed(file_server, tmp_path):
+    local = tmp_path / "croco_avg_temp_surf.mp4"
+    part = tmp_path / "croco_avg_temp_surf.mp4.part"
+    body = file_server["body"]
+
+    # The source changed since the partial file was written: If-Range fails
+    part.write_bytes(b"old version")
+    os.utime(part, (1.6e9, 1.6e9))
+    assert download_gifs.download_file(file_server["url"], str(local))
+    assert file_server["requests"] == [(f"bytes={len(b'old version')}-", 200)]
+    assert local.read_bytes() == body
+
+    # A partial file longer than the source: 416, then a fresh download
+    file_server["requests"].clear()
+    part.write_bytes(body + b"extra")
+    os.utime(part, (1.7e9, 1.7e9))
+    assert download_gifs.download_file(file_server["url"], str(local))
+    assert file_server["requests"] == [(f"bytes={len(body) + 5}-", 416), (None, 200)]
+    assert local.read_bytes() == body
+
+
+def test_download_keeps_a_chunked_response_without_validators(file_server, tmp_path):
+    file_server.update(chunked=True, last_modified=None)
+    local = tmp_path / "croco_avg_temp_surf.mp4"
+
+    meta = download_gifs.download_file(file_server["url"], str(local))
+    assert meta["size"] == len(file_server["body"])
+    assert local.read_bytes() == file_server["body"]
+
+    # Interrupted without a validator: downloaded again in full, not resumed
+    file_server.update(truncate=1, requests=[])
+    local.unlink()
+    assert download_gifs.download_file(file_server["url"], str(local))
+    assert file_server["requests"] == [(None, 200), (None, 200)]
+    assert local.read_bytes() == file_server["body"]
+    assert not (tmp_path / "croco_avg_temp_surf.mp4.part").exists()